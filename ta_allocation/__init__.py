@@ -0,0 +1 @@
+# Headless TA allocation pipeline used by the Streamlit app (ta_allocation_app.py)
@@ -0,0 +1,5 @@
+import sys
+
+from ta_allocation.cli import main
+
+sys.exit(main())
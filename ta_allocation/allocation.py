@@ -0,0 +1,176 @@
+# Allocation engines working on integer-encoded TAs/courses and NumPy capacity/need arrays
+import heapq
+
+import pandas as pd
+import numpy as np
+
+# Loads below this are treated as zero (float sums of capacities and needs)
+LOAD_TOLERANCE = 1e-9
+
+
+# Encode labels as integer indices (codes into the returned array of unique labels)
+def encode(labels):
+    codes, uniques = pd.factorize(np.asarray(labels, dtype=object), use_na_sentinel=False)
+    return codes, np.asarray(uniques, dtype=object)
+
+# Value per code, keeping the last one when a code appears more than once (as "dict(zip(...))" does)
+def last_value_per_code(codes, values, size):
+    codes = np.asarray(codes)
+    values = np.asarray(values, dtype=float)
+    result = np.full(size, np.nan)
+    unique_codes, last_reversed = np.unique(codes[::-1], return_index=True)
+    result[unique_codes] = values[len(codes) - 1 - last_reversed]
+    return result
+
+# Greedy allocation over rows already sorted by priority (course blocks first).
+# "capacity" (per TA) and "need" (per course) are updated in place; exhausted TAs are skipped
+# and the remaining rows of an exhausted course are jumped over without filtering any frame.
+# Returns the allocated row positions and loads.
+def greedy_allocation(ta_codes, course_codes, capacity, need):
+    ta_codes = np.asarray(ta_codes)
+    course_codes = np.asarray(course_codes)
+    n_rows = len(course_codes)
+    if n_rows == 0:
+        return np.array([], dtype=int), np.array([], dtype=float)
+
+    # End of the block of consecutive rows of the same course
+    block_starts = np.flatnonzero(np.r_[True, course_codes[1:] != course_codes[:-1]])
+    block_ends = np.r_[block_starts[1:], n_rows]
+    block_end = np.repeat(block_ends, np.diff(np.r_[block_starts, n_rows]))
+
+    rows = []
+    loads = []
+    ta_list = ta_codes.tolist()
+    course_list = course_codes.tolist()
+    row = 0
+    while row < n_rows:
+        course = course_list[row]
+        # Check if course can be allocated (NaN needs are never allocated)
+        if not need[course] > 0:
+            row = block_end[row]
+            continue
+        ta = ta_list[row]
+        # Check if TA still has capacity
+        if capacity[ta] > 0:
+            allocated_weight = min(need[course], capacity[ta])
+            rows.append(row)
+            loads.append(allocated_weight)
+            capacity[ta] -= allocated_weight
+            need[course] -= allocated_weight
+        row += 1
+
+    return np.asarray(rows, dtype=int), np.asarray(loads, dtype=float)
+
+# Greedy allocation in rounds: rows sorted by round (ex. preference rank), then by priority within the round (course
+# blocks first). Each round only visits its rows whose course still has need and whose TA still has capacity, and
+# "capacity"/"need" carry over from one round to the next (updated in place). Returns the allocated row positions and loads.
+def round_allocation(ta_codes, course_codes, rounds, capacity, need):
+    ta_codes = np.asarray(ta_codes)
+    course_codes = np.asarray(course_codes)
+    rounds = np.asarray(rounds)
+    n_rows = len(rounds)
+    round_starts = np.flatnonzero(np.r_[True, rounds[1:] != rounds[:-1]]) if n_rows else np.array([], dtype=int)
+    round_ends = np.r_[round_starts[1:], n_rows]
+
+    rows = []
+    loads = []
+    for start, end in zip(round_starts, round_ends):
+        # Rows of the round which can still be allocated (NaN needs never are)
+        open_rows = start + np.flatnonzero((need[course_codes[start:end]] > 0) & (capacity[ta_codes[start:end]] > 0))
+        round_rows, round_loads = greedy_allocation(ta_codes[open_rows], course_codes[open_rows], capacity, need)
+        rows.append(open_rows[round_rows])
+        loads.append(round_loads)
+
+    if not rows:
+        return np.array([], dtype=int), np.array([], dtype=float)
+    return np.concatenate(rows), np.concatenate(loads)
+
+# Capacitated deferred acceptance (stable allocation): every TA proposes all its free capacity to its preferred course
+# which has not rejected it, and every course keeps the best proposals up to its need, in a heap whose top is its worst
+# kept proposal. Rejected load goes back to the TA, which moves on to its next course once a course rejects it.
+# Rows are the eligible (TA, course) pairs: "ta_order" lists them by TA, then in the TA's preference order, and
+# "course_priority" ranks them within their course (lower first). Returns the load of every row: no TA and course
+# would both rather exchange load with each other (stable), and it is the best stable allocation for the TAs.
+def deferred_acceptance(ta_codes, course_codes, ta_order, course_priority, capacity, need):
+    ta_codes = np.asarray(ta_codes)
+    ta_order = np.asarray(ta_order)
+    free = np.nan_to_num(np.asarray(capacity, dtype=float), nan=0.0).clip(min=0).tolist()
+    need = np.nan_to_num(np.asarray(need, dtype=float), nan=0.0).clip(min=0).tolist()
+    n_rows, n_tas = len(ta_codes), len(free)
+
+    # Proposals of each TA: ta_order[pointer[ta]:ends[ta]], the pointer moving on at each rejection
+    sorted_tas = ta_codes[ta_order]
+    pointer = np.searchsorted(sorted_tas, np.arange(n_tas), side="left").tolist()
+    ends = np.searchsorted(sorted_tas, np.arange(n_tas), side="right").tolist()
+    ta_list = ta_codes.tolist()
+    course_list = np.asarray(course_codes).tolist()
+    order_list = ta_order.tolist()
+    priority = np.asarray(course_priority).tolist()
+
+    loads = [0.0] * n_rows
+    held = [0.0] * len(need)
+    kept = [False] * n_rows
+    heaps = [[] for _ in need]
+    proposing = [ta for ta in range(n_tas) if free[ta] > LOAD_TOLERANCE and pointer[ta] < ends[ta]]
+    while proposing:
+        ta = proposing.pop()
+        if free[ta] <= LOAD_TOLERANCE or pointer[ta] >= ends[ta]:
+            continue
+        row = order_list[pointer[ta]]
+        course = course_list[row]
+        loads[row] += free[ta]
+        held[course] += free[ta]
+        free[ta] = 0.0
+        if not kept[row]:
+            heapq.heappush(heaps[course], (-priority[row], row))
+            kept[row] = True
+
+        # Reject the worst kept proposals until the course holds no more than its need
+        while held[course] - need[course] > LOAD_TOLERANCE:
+            worst = heaps[course][0][1]
+            rejected = min(held[course] - need[course], loads[worst])
+            loads[worst] -= rejected
+            held[course] -= rejected
+            worst_ta = ta_list[worst]
+            free[worst_ta] += rejected
+            if pointer[worst_ta] < ends[worst_ta] and order_list[pointer[worst_ta]] == worst:
+                pointer[worst_ta] += 1
+            if loads[worst] <= LOAD_TOLERANCE:
+                loads[worst] = 0.0
+                heapq.heappop(heaps[course])
+                kept[worst] = False
+            proposing.append(worst_ta)
+
+    return np.asarray(loads, dtype=float)
+
+# Optimal allocation as a min-cost transportation problem, solved locally with HiGHS (scipy.optimize.linprog).
+# Each row is an eligible (TA, course) pair with a cost per unit of load; TAs supply "capacity" and courses
+# demand "need". Need left unmet costs "unmet_cost" per unit, which must exceed every row cost so that
+# covering the needs always comes first. Returns the load of every row and the unmet need per course.
+def min_cost_allocation(ta_codes, course_codes, costs, capacity, need, unmet_cost):
+    from scipy.optimize import linprog
+    from scipy.sparse import csr_matrix, hstack, identity
+
+    ta_codes = np.asarray(ta_codes)
+    course_codes = np.asarray(course_codes)
+    capacity = np.nan_to_num(np.asarray(capacity, dtype=float), nan=0.0).clip(min=0)
+    need = np.nan_to_num(np.asarray(need, dtype=float), nan=0.0).clip(min=0)
+    n_rows, n_courses = len(course_codes), len(need)
+    if n_rows == 0:
+        return np.zeros(0), need.copy()
+
+    # Variables: one load per row, then one unmet need slack per course
+    row_positions = np.arange(n_rows)
+    ta_matrix = csr_matrix((np.ones(n_rows), (ta_codes, row_positions)), shape=(len(capacity), n_rows))
+    course_matrix = csr_matrix((np.ones(n_rows), (course_codes, row_positions)), shape=(n_courses, n_rows))
+    a_ub = hstack([ta_matrix, csr_matrix((len(capacity), n_courses))]).tocsr()
+    a_eq = hstack([course_matrix, identity(n_courses, format="csr")]).tocsr()
+    objective = np.r_[np.asarray(costs, dtype=float), np.full(n_courses, unmet_cost)]
+
+    result = linprog(objective, A_ub=a_ub, b_ub=capacity, A_eq=a_eq, b_eq=need, bounds=(0, None), method="highs")
+    if not result.success:
+        raise ValueError(f"The optimal allocation could not be solved: {result.message}")
+
+    loads = result.x[:n_rows]
+    loads[loads < 1e-9] = 0.0
+    return loads, result.x[n_rows:]
@@ -0,0 +1,102 @@
+# Benchmark of the pipeline on synthetic faculties (see synthetic.py): times the ingestion of the four files and every
+# stage of the pipeline (see stages.py) up to the output tables, and compares them with saved results to track
+# regressions.
+#   python -m ta_allocation.benchmark --sizes small,large --repeat 3 --save benchmark.json
+#   python -m ta_allocation.benchmark --sizes small,large --repeat 3 --baseline benchmark.json
+import argparse
+import json
+import os
+import sys
+import tempfile
+
+import pandas as pd
+
+from ta_allocation import stages, synthetic
+
+BENCHMARK_DATA_DIR = os.path.join(tempfile.gettempdir(), "ta_allocation_benchmark")
+# A stage regresses when it is slower than its baseline by more than both tolerances
+REGRESSION_TOLERANCE = 0.2
+REGRESSION_MIN_SECONDS = 0.01
+
+
+# Input files of a synthetic faculty, generated on the first use
+def benchmark_files(size, seed=1, data_dir=BENCHMARK_DATA_DIR):
+    output_dir = os.path.join(data_dir, f"{size}-seed{seed}")
+    paths = {kind: os.path.join(output_dir, file_name) for kind, file_name in synthetic.FILE_NAMES.items()}
+    if not all(os.path.exists(path) for path in paths.values()):
+        paths = synthetic.generate(output_dir, *synthetic.SIZES[size], seed=seed)
+    return paths
+
+# Seconds taken by the ingestion of each file and by each stage, in one run (without memoization)
+def time_run(paths, term="S1", allocation_mode="greedy"):
+    timings = {}
+    file_data = {}
+    for kind, path in paths.items():
+        with open(path, "rb") as file:
+            file_data[kind] = file.read()
+
+    _, records = stages.profile_run(file_data, term, allocation_mode, trace_memory=False)
+    for record in records:
+        timings[record["STEP"]] = record["SECONDS"]
+    timings["total"] = sum(timings.values())
+    return timings
+
+# Median seconds of each step over "repeat" runs (after a warm-up run), by size: {size: {step: seconds}}
+def run_benchmark(sizes, repeat=3, seed=1, data_dir=BENCHMARK_DATA_DIR):
+    results = {}
+    for size in sizes:
+        paths = benchmark_files(size, seed, data_dir)
+        # Warm-up run (imports and first-call overheads)
+        time_run(paths)
+        runs = pd.DataFrame([time_run(paths) for _ in range(repeat)])
+        results[size] = runs.median().to_dict()
+    return results
+
+# Comparison table of the results with a baseline (same format), flagging the regressions
+def compare(results, baseline, tolerance=REGRESSION_TOLERANCE, min_seconds=REGRESSION_MIN_SECONDS):
+    rows = []
+    for size, timings in results.items():
+        for step, seconds in timings.items():
+            baseline_seconds = baseline.get(size, {}).get(step)
+            rows.append({
+                "SIZE": size,
+                "STEP": step,
+                "SECONDS": seconds,
+                "BASELINE SECONDS": baseline_seconds,
+                "REGRESSION": baseline_seconds is not None and seconds > baseline_seconds * (1 + tolerance) and seconds - baseline_seconds > min_seconds,
+            })
+    return pd.DataFrame(rows, columns=["SIZE", "STEP", "SECONDS", "BASELINE SECONDS", "REGRESSION"])
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m ta_allocation.benchmark", description="Benchmark the pipeline on synthetic data.")
+    parser.add_argument("--sizes", default="small,medium", help=f"comma-separated sizes among {', '.join(synthetic.SIZES)} (default: small,medium)")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per size, the median is reported (default: 3)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--data-dir", default=BENCHMARK_DATA_DIR, help="directory of the generated input files")
+    parser.add_argument("--save", help="write the results to this JSON file")
+    parser.add_argument("--baseline", help="compare with the results in this JSON file (exit code 1 on regressions)")
+    args = parser.parse_args(argv)
+    sizes = args.sizes.split(",")
+    unknown = [size for size in sizes if size not in synthetic.SIZES]
+    if unknown:
+        parser.error(f"unknown size(s): {', '.join(unknown)}")
+
+    results = run_benchmark(sizes, args.repeat, args.seed, args.data_dir)
+    baseline = {}
+    if args.baseline:
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+    comparison = compare(results, baseline)
+    print(comparison.to_string(index=False, float_format=lambda seconds: f"{seconds:.4f}"))
+
+    if args.save:
+        with open(args.save, "w") as file:
+            json.dump(results, file, indent=2)
+    if comparison["REGRESSION"].any():
+        print(f"{comparison['REGRESSION'].sum()} regression(s)", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,96 @@
+# Persistent cache of the parsed input files, keyed by the SHA-256 of the uploaded bytes.
+# Tables are stored as Parquet (gzipped pickle for the ones Arrow cannot store exactly, ex. columns mixing text
+# and numbers), with a size-bounded least-recently-used eviction.
+import hashlib
+import os
+import pickle
+import tempfile
+
+import pandas as pd
+
+CACHE_DIR = os.environ.get("TA_ALLOCATION_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "ta_allocation"))
+CACHE_MAX_BYTES = int(float(os.environ.get("TA_ALLOCATION_CACHE_MAX_MB", 256)) * 1024 * 1024)
+# Bump when a parser changes, so that files parsed by the previous version are not reused
+CACHE_VERSION = 1
+
+CACHE_EXTENSIONS = (".parquet", ".pkl.gz")
+
+
+def cache_key(file_data, kind):
+    return f"{kind}-v{CACHE_VERSION}-{hashlib.sha256(file_data).hexdigest()}"
+
+# Parsed table of a file, from the cache if the same bytes were parsed before ("parse" is called otherwise)
+def load_or_parse(file_data, kind, parse, cache_dir=CACHE_DIR, max_bytes=CACHE_MAX_BYTES):
+    key = cache_key(file_data, kind)
+    for extension in CACHE_EXTENSIONS:
+        path = os.path.join(cache_dir, key + extension)
+        try:
+            df = pd.read_parquet(path) if extension == ".parquet" else pd.read_pickle(path)
+        except (FileNotFoundError, OSError, ValueError, pickle.UnpicklingError, EOFError):
+            continue
+        # Mark as recently used
+        os.utime(path)
+        return df
+
+    df = parse()
+    try:
+        store(df, key, cache_dir)
+        evict(cache_dir, max_bytes)
+    except OSError:
+        # The cache is an optimisation only (ex. read-only file system)
+        pass
+    return df
+
+def store(df, key, cache_dir=CACHE_DIR):
+    os.makedirs(cache_dir, exist_ok=True)
+    # Write to a temporary file first, so that concurrent sessions never read a partial file
+    handle, temporary_path = tempfile.mkstemp(dir=cache_dir, suffix=".tmp")
+    os.close(handle)
+    try:
+        try:
+            df.to_parquet(temporary_path)
+            extension = ".parquet"
+            # Keep Parquet only if it gives back exactly the same table
+            if not pd.read_parquet(temporary_path).equals(df):
+                raise ValueError("Parquet does not round-trip this table")
+        except Exception:
+            df.to_pickle(temporary_path, compression={"method": "gzip", "compresslevel": 1})
+            extension = ".pkl.gz"
+        os.replace(temporary_path, os.path.join(cache_dir, key + extension))
+    finally:
+        if os.path.exists(temporary_path):
+            os.remove(temporary_path)
+
+# Cached files, from the least to the most recently used
+def cache_entries(cache_dir=CACHE_DIR):
+    if not os.path.isdir(cache_dir):
+        return []
+    entries = []
+    for name in os.listdir(cache_dir):
+        if name.endswith(CACHE_EXTENSIONS):
+            path = os.path.join(cache_dir, name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+    return sorted(entries)
+
+# Remove the least recently used files until the cache fits in "max_bytes"
+def evict(cache_dir=CACHE_DIR, max_bytes=CACHE_MAX_BYTES):
+    entries = cache_entries(cache_dir)
+    total_bytes = sum(size for _, size, _ in entries)
+    for _, size, path in entries:
+        if total_bytes <= max_bytes:
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total_bytes -= size
+
+def cache_size(cache_dir=CACHE_DIR):
+    return sum(size for _, size, _ in cache_entries(cache_dir))
+
+def clear_cache(cache_dir=CACHE_DIR):
+    evict(cache_dir, max_bytes=0)
@@ -0,0 +1,43 @@
+# Course catalog, built once per run: one row per course key ("CODE || NAME || TERM || LANGUAGE"), whose position is
+# the course integer ID. Each key is split once, into categorical code/name/period/language columns, with the
+# course flags (masters course, semester course) and its cycle in the DSD. Survey courses which are not in the DSD
+# are appended after the DSD ones ("dsd" is False).
+import pandas as pd
+import numpy as np
+
+from ta_allocation import workload
+
+KEY_PARTS = ["course_code", "course_name", "period", "language"]
+
+
+# Split course keys into their four parts (None for missing parts)
+def split_keys(courses):
+    parts = [str(course).split(" || ") for course in courses]
+    return [tuple(part[:4]) + (None,) * (4 - len(part[:4])) for part in parts]
+
+def build_catalog(courses, cycles=None, dsd=True):
+    courses = pd.unique(pd.Series(courses, dtype=object))
+    catalog = pd.DataFrame(split_keys(courses), columns=KEY_PARTS, dtype=object)
+    catalog.insert(0, "course", courses)
+    catalog["cycle"] = pd.Series(cycles, dtype=object).to_numpy() if cycles is not None else None
+    catalog["masters_course"] = workload.masters_course_flag(courses)
+    catalog["semester"] = workload.semester_flag(courses)
+    catalog["dsd"] = dsd
+    return catalog.astype({column: "category" for column in KEY_PARTS + ["cycle"]})
+
+# Catalog with the courses not yet in it appended (new IDs after the existing ones)
+def extend_catalog(catalog, courses):
+    courses = pd.unique(pd.Series(courses, dtype=object))
+    new_courses = courses[pd.Index(catalog["course"]).get_indexer(courses) == -1]
+    if len(new_courses) == 0:
+        return catalog
+    extended = pd.concat([catalog.astype({column: object for column in KEY_PARTS + ["cycle"]}), build_catalog(new_courses, dsd=False)], ignore_index=True)
+    return extended.astype({column: "category" for column in KEY_PARTS + ["cycle"]})
+
+# IDs of course keys (-1 for keys not in the catalog)
+def course_ids(catalog, courses):
+    return pd.Index(catalog["course"]).get_indexer(pd.Series(courses, dtype=object))
+
+# Column of the catalog for an array of course IDs
+def lookup(catalog, ids, column):
+    return catalog[column].to_numpy()[np.asarray(ids)]
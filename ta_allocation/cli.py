@@ -0,0 +1,106 @@
+# Command-line entry point for batch allocation runs (no Streamlit import, so it starts fast):
+#   python -m ta_allocation --courses dsd.xlsx --weights weights.xlsx --contracts contracts.xlsx \
+#       --preferences survey.xlsx --term S1 --output-dir outputs
+import argparse
+import io
+import sys
+
+import pandas as pd
+
+from ta_allocation import cache, diagnostics, engine, export, ingest, scenarios, stages, workload
+
+# Exit codes
+EXIT_OK = 0
+EXIT_ERROR = 1
+EXIT_DATA_ISSUES = 2
+
+# Outputs reporting data-quality problems (the run is still complete, but they should be checked)
+DATA_ISSUES = {
+    "output_4": "TAs e-mails from the survey which are not in the contract file",
+    "output_8": "courses from the survey without match in the course list",
+    "output_9": "TAs affected by unmatched courses",
+    "output_15": "contract percentages from the survey which could not be parsed",
+}
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m ta_allocation", description="Teaching Assistants allocation (batch run).")
+    parser.add_argument("--courses", required=True, help="faculty courses (DSD) Excel file")
+    parser.add_argument("--weights", required=True, help="BS course weights Excel file")
+    parser.add_argument("--contracts", required=True, help="TAs contract Excel file")
+    parser.add_argument("--preferences", required=True, help="TAs preferences (Qualtrics export) Excel file")
+    parser.add_argument("--term", required=True, choices=list(engine.SEMESTER_TERMS), help="semester")
+    parser.add_argument("--output-dir", required=True, help="directory where the outputs are written")
+    parser.add_argument("--format", default="xlsx", choices=["xlsx", "workbook", "csv", "parquet"],
+                        help="one file per output (xlsx, csv, parquet) or a single workbook (default: xlsx)")
+    parser.add_argument("--allocation-mode", default="greedy", choices=list(engine.ALLOCATION_MODES), help="allocation mode (default: greedy)")
+    parser.add_argument("--no-cache", action="store_true", help="do not use the cache of parsed files")
+    parser.add_argument("--sweep", action="append", default=[], metavar="PARAMETER=VALUE,VALUE...",
+                        help="scenario sweep over a workload parameter (repeat for a grid): only the scenario comparison is written. "
+                             f"Parameters: {', '.join(workload.DEFAULT_PARAMETERS)}")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes of the scenario sweep (default: one per CPU)")
+    parser.add_argument("--diagnostics", metavar="PATH",
+                        help="write the seconds, peak memory and rows in and out of each step to this JSON file (the files are read without the cache, ignored by --sweep)")
+    args = parser.parse_args(argv)
+    try:
+        args.sweep = parse_sweep(args.sweep)
+    except ValueError as e:
+        parser.error(str(e))
+    return args
+
+# Grid of a scenario sweep from "PARAMETER=VALUE,VALUE..." arguments
+def parse_sweep(values):
+    grid = {}
+    for value in values:
+        name, _, parameter_values = value.partition("=")
+        if name not in workload.DEFAULT_PARAMETERS or not parameter_values:
+            raise ValueError(f"invalid --sweep value: {value!r}")
+        grid[name] = [float(parameter_value) for parameter_value in parameter_values.split(",")]
+    return grid
+
+def read_input(path, kind, use_cache):
+    with open(path, "rb") as file:
+        file_data = file.read()
+    if kind == "preferences":
+        parse = lambda: ingest.read_preferences(io.BytesIO(file_data))
+    else:
+        parse = lambda: pd.read_excel(io.BytesIO(file_data))
+    return cache.load_or_parse(file_data, kind, parse) if use_cache else parse()
+
+# Outputs of a run reading and measuring every step (see stages.profile_run), with the diagnostics written to "path"
+def profile_run(args, path):
+    file_data = {}
+    for kind in stages.FILE_INPUTS:
+        with open(getattr(args, kind), "rb") as file:
+            file_data[kind] = file.read()
+    outputs, records = stages.profile_run(file_data, args.term, args.allocation_mode)
+    with open(path, "w") as file:
+        file.write(diagnostics.records_json(records))
+    return outputs
+
+def main(argv=None):
+    args = parse_args(argv)
+    try:
+        if args.diagnostics and not args.sweep:
+            outputs = profile_run(args, args.diagnostics)
+        else:
+            dsd_df = read_input(args.courses, "excel", not args.no_cache)
+            bs_weights_df = read_input(args.weights, "excel", not args.no_cache)
+            contract = read_input(args.contracts, "excel", not args.no_cache)
+            preferences_df = read_input(args.preferences, "preferences", not args.no_cache)
+            if args.sweep:
+                comparison = scenarios.run_sweep(dsd_df, bs_weights_df, contract, preferences_df, args.term, args.sweep, args.workers)
+                paths = export.write_tables({"scenario_comparison": comparison}, args.output_dir, args.format)
+                print(f"{len(comparison)} scenario(s) written to {paths[0]}")
+                return EXIT_OK
+            outputs = engine.run_pipeline(dsd_df, bs_weights_df, contract, preferences_df, args.term, args.allocation_mode)
+        paths = export.write_tables(export.named_tables(outputs), args.output_dir, args.format)
+    except Exception as e:
+        print(f"An error occurred while running the allocation: {e}", file=sys.stderr)
+        return EXIT_ERROR
+
+    print(f"{len(paths)} file(s) written to {args.output_dir}")
+    issues = {key: len(outputs[key]) for key in DATA_ISSUES if len(outputs[key]) > 0}
+    for key, rows in issues.items():
+        print(f"Data issue: {rows} {DATA_ISSUES[key]} ({export.OUTPUT_NAMES[key]})", file=sys.stderr)
+    return EXIT_DATA_ISSUES if issues else EXIT_OK
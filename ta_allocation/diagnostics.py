@@ -0,0 +1,77 @@
+# Instrumentation of a run: seconds, peak memory and row counts in and out of the ingestion of each file and of every
+# stage of the pipeline (see stages.run_stages and stages.profile_run), as records which can be shown as a table or
+# exported as JSON
+import json
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+import pandas as pd
+import numpy as np
+
+# Main input of each stage (its rows are the rows into the stage)
+MAIN_INPUTS = {
+    "faculty": "dsd_df",
+    "courses": "dsd_df",
+    "bs_weights": "bs_weights_df",
+    "contracts": "contract",
+    "preferences": "preferences_df",
+    "adapted": "preferences",
+    "contract_changes": "preferences",
+    "market": "adapted",
+    "allocation": "market",
+    "course_reports": "allocation",
+    "outputs": "allocation",
+    "output_2": "preferences",
+    "output_3": "preferences",
+    "output_4": "preferences",
+    "output_6": "contracts",
+    "output_7": "contract_changes",
+    "output_9": "adapted",
+}
+
+# Main table of the stage results which are dicts (its rows are the rows out of the stage)
+MAIN_TABLES = {
+    "courses": "course_demand",
+    "contracts": "contract",
+    "preferences": "preferences_df_final",
+    "contract_changes": "all_contracts",
+    "market": "final_market",
+    "allocation": "ta_allocations",
+    "course_reports": "output_11",
+    "outputs": "output_11",
+}
+
+
+# Rows of a stage input or result (None for values which are not tables)
+def row_count(name, value):
+    if isinstance(value, dict):
+        value = value.get(MAIN_TABLES.get(name))
+    if isinstance(value, (pd.DataFrame, pd.Series, np.ndarray, list)):
+        return len(value)
+    return None
+
+# Record the seconds and peak memory (MB above the memory at the start, if tracemalloc is tracing) of the block.
+# The block can set "ROWS OUT" (and "ROWS IN") on the yielded record.
+@contextmanager
+def measure(records, step, part=None, rows_in=None):
+    record = {"STEP": step, "PART": part, "ROWS IN": rows_in, "ROWS OUT": None, "CACHED": False}
+    tracing = tracemalloc.is_tracing()
+    if tracing:
+        tracemalloc.reset_peak()
+        start_memory = tracemalloc.get_traced_memory()[0]
+    start = time.perf_counter()
+    try:
+        yield record
+    finally:
+        record["SECONDS"] = time.perf_counter() - start
+        record["PEAK MEMORY (MB)"] = (tracemalloc.get_traced_memory()[1] - start_memory) / 1024 / 1024 if tracing else None
+        records.append(record)
+
+# Records as a table (steps in execution order)
+def records_table(records):
+    columns = ["STEP", "PART", "ROWS IN", "ROWS OUT", "SECONDS", "PEAK MEMORY (MB)", "CACHED"]
+    return pd.DataFrame(records, columns=columns)
+
+def records_json(records):
+    return json.dumps({"steps": records, "total_seconds": sum(record["SECONDS"] for record in records)}, indent=2, default=str)
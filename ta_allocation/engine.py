@@ -0,0 +1,740 @@
+# Headless allocation pipeline: pure functions from the uploaded DataFrames to the app's output tables.
+# Nothing in this module imports Streamlit, so it can be cached, scripted or tested on its own.
+import pandas as pd
+import numpy as np
+
+from ta_allocation import allocation, catalog, load_requests, matching, workload
+
+# Terms taught in each semester
+SEMESTER_TERMS = {
+    "S1": ["S1", "T1", "T2"],
+    "S2": ["S2", "T3", "T4"],
+}
+
+# Aggregations used for the course list (number of classes and students)
+AGG_FUNCTIONS = {
+    'CLASS': 'count',
+    'SLOTS': np.sum
+}
+
+# Survey questions used to locate the relevant columns (matched with "startswith")
+EMAIL_STR = "Please write your E-mail @novasbe.pt"
+CONTINUE_STR = "Do you intend to continue your collaboration with Nova SBE next semester"
+CONTINUE_JUST_STR = "Please write here a short justification on why you do not intend to continue"
+BS_OR_MS_STR = "Do you prefer to be assigned to Bachelor’s or Master's courses?"
+LOAD_AVAILABILITY_STR = "What is your availability in terms of workload and contract percentage for the next semester?"
+MS_STUDENT_STR = "In the upcoming semester, are you going to be a Nova SBE student?"
+PHD_RESTRICTIONS_STR = "Being a PhD student, do you have any constraint in the number of teaching hours or contract percentage"
+BS_STR = "Please choose below your teaching preferences for Bachelor Courses."
+MS_STR = "Please choose below your teaching preferences for Masters Courses (grading)."
+
+# Translation mapping for the BS/MS preference question
+PREFERENCE_TYPE_MAPPING = {
+    "Masters' Courses": 2,
+    "Bachelors' Courses": 0,
+    "Indifferent": 1,
+    pd.NaT: 1  # Assuming NaN values should also be considered "Indifferent"
+}
+
+CHANGE_LOAD_MAPPING = {
+    "I want to increase the contract percentage/workload in the next semester (please specify the desired contract percentage level)": 1,
+    "I want to keep the same contract percentage/workload as this semester": 0,
+    "I want to reduce the contract percentage/workload in the next semester (please specify the desired contract percentage level)": -1,
+    pd.NaT: 0
+}
+
+MS_STUDENT_MAPPING = {
+    "Yes, I am a PhD student": 0,
+    "Yes, I will be a Masters student but not doing any courses, only the Work Project": 0,
+    "Yes, I will be a Masters student and I will be doing at least one more course": 1,
+    "No": 0,
+    pd.NaT: 0
+}
+
+PHD_RESTRICTIONS_MAPPING = {
+    "Yes, I have some other constraints that limit my teaching hours/workload (please specify the reason and the limit)": 1,
+    "Yes, I have a FCT scholarship that limits my weekly teaching hours to 4h per week": 1,
+    "No": 0,
+    pd.NaT: 0
+}
+
+
+# Compact dtypes of the TA x course tables (adapted_df, final_market): categorical TAs and courses, 8-bit integers for
+# the small integer columns (32-bit floats when they have missing values), 32-bit floats for the class/student counts
+# and 32-bit integers for the course IDs. The weights, capacities and loads stay 64-bit floats (allocation arithmetic).
+CATEGORICAL_COLUMNS = ["TA", "course", "match_method"]
+SMALL_INTEGER_COLUMNS = ["preference", "preference_type", "masters_course", "semester", "master_student"]
+COUNT_COLUMNS = ["number_classes", "number_students"]
+ID_COLUMNS = ["survey_course_id", "course_id"]
+
+def compact_market(df):
+    dtypes = {}
+    for column in df.columns:
+        if column in CATEGORICAL_COLUMNS:
+            dtypes[column] = "category"
+        elif column in SMALL_INTEGER_COLUMNS:
+            dtypes[column] = np.float32 if df[column].isna().any() else np.int8
+        elif column in COUNT_COLUMNS:
+            dtypes[column] = np.float32
+        elif column in ID_COLUMNS:
+            dtypes[column] = np.int32
+    return df.astype(dtypes)
+
+# Table with the categorical columns as objects (for the output tables)
+def uncategorize(df):
+    return df.astype({column: object for column in df.columns if isinstance(df[column].dtype, pd.CategoricalDtype)})
+
+
+# PART 1: LIST OF COURSES (DSD)
+#########################################################################################################################################
+# Faculty e-mails of the whole DSD (all terms), excluded from the TAs
+def faculty_emails(dsd_df):
+    return dsd_df[dsd_df["COURSE NAME"] != "Stata"]["FACULTY EMAIL"].unique()
+
+def process_courses(dsd_df, term):
+    dsd_df = dsd_df.copy()
+    dsd_df["course"] = dsd_df["COURSE CODE"].astype(str) + " || " + dsd_df["COURSE NAME"].astype(str) + " || " + dsd_df["TERM"].astype(str) + " || " + dsd_df["LANGUAGE"].astype(str)
+
+    # Creat list of faculty's emails
+    faculty_list = faculty_emails(dsd_df)
+
+    # Assume that BS courses without "FACULTY NAME" are teorico-practicas
+    teorico_practicas = dsd_df[(dsd_df["FACULTY NAME"].isna()) & (dsd_df["CYCLE"] == "BSC")]["COURSE NAME"].unique()
+    dsd_df = dsd_df.drop(dsd_df[(dsd_df["COURSE NAME"].isin(teorico_practicas)) & (dsd_df["FACULTY NAME"].notna())].index)
+
+    dsd_df = dsd_df[dsd_df['TERM'].isin(SEMESTER_TERMS[term])]
+
+    # OUTPUT #1: LIST OF COURSES IMPORTED
+    output_1 = dsd_df.groupby(['COURSE NAME', 'TERM', 'COURSE CODE', 'LANGUAGE', 'CYCLE']).agg(AGG_FUNCTIONS).reset_index()
+    output_1 = output_1.rename(columns={'CLASS': 'Nº CLASSES', 'SLOTS': 'Nº STUDENTS'})
+
+    # Creat full course list for matching algorithm
+    full_courses = dsd_df[dsd_df['CYCLE'].isin(['MST', 'BSC', 'ME'])]
+    full_courses = full_courses.groupby(['course', 'CYCLE', 'TERM']).agg(AGG_FUNCTIONS).reset_index()
+
+    # Table actually used for computations (different from OUPUT #1)
+    course_demand = dsd_df.groupby(['course']).agg(AGG_FUNCTIONS).reset_index()
+    course_demand = course_demand.rename(columns={'CLASS': 'number_classes', 'SLOTS': 'number_students'})
+
+    # Course catalog of the DSD courses (the course ID is the position in course_demand)
+    course_cycles = dsd_df.groupby('course')['CYCLE'].first().reindex(course_demand['course'])
+    course_catalog = catalog.build_catalog(course_demand['course'], course_cycles)
+
+    course_demand_extended = course_catalog[["course", *catalog.KEY_PARTS, "masters_course"]].astype({column: object for column in catalog.KEY_PARTS})
+
+    # INPUT #3 Get file course list to manually input the weights
+    course_demand_extended_bs = course_demand_extended[course_demand_extended.masters_course==0]
+    course_demand_extended_bs = course_demand_extended_bs.drop(columns=["masters_course"])
+    course_demand_extended_bs["weight"] = ""
+
+    return {
+        "faculty_list": faculty_list,
+        "output_1": output_1,
+        "full_courses": full_courses,
+        "course_demand": course_demand,
+        "course_demand_extended": course_demand_extended,
+        "course_demand_extended_bs": course_demand_extended_bs,
+        "catalog": course_catalog,
+    }
+
+def process_bs_weights(bs_weights_df, parameters=workload.DEFAULT_PARAMETERS):
+    bs_weights_df = bs_weights_df[["course", "weight"]].copy()
+    bs_weights_df["weight"] = workload.bs_course_weight(bs_weights_df["weight"], workload.parameter(parameters, "bs_weight_unit"))
+    return bs_weights_df
+
+
+# PART 2: TAs CURRENT CONTRACT
+#########################################################################################################################################
+def process_contracts(contract, faculty_list):
+    contract = contract[["TA", "CONTRACT"]].copy()
+    contract["TA"] = contract["TA"].str.lower()
+    # Drop contracts with zero percentage and faculty emails
+    zero_contracts = contract[contract['CONTRACT'] == 0]["TA"].unique()
+    contract = contract[contract['CONTRACT'] != 0]
+    contract = contract[~contract['TA'].isin(faculty_list)]
+
+    return {
+        "contract": contract,
+        "zero_contracts": zero_contracts,
+        "contract_emails": contract.TA.unique(),
+    }
+
+
+# PART 3: TAs PREFERENCES (QUALTRICS SURVEY)
+#########################################################################################################################################
+
+# Determine column numbers of the survey questions used in the rest of the code
+def locate_survey_columns(columns):
+    column_df = pd.DataFrame({'Column Name': columns,
+                          'Column Number': range(len(columns))})
+
+    def startswith(text):
+        return column_df[column_df['Column Name'].str.startswith(text)].iloc[0]["Column Number"]
+
+    survey_columns = {
+        "full_name": column_df[column_df['Column Name'] == "Full Name"].iloc[0]["Column Number"],
+        "ta": column_df[column_df['Column Name'] == "TA"].iloc[0]["Column Number"],
+        "continue": startswith(CONTINUE_STR),
+        "continue_just": startswith(CONTINUE_JUST_STR),
+        "ms_student": startswith(MS_STUDENT_STR),
+        "bs_or_ms": startswith(BS_OR_MS_STR),
+        "phd_restrictions": startswith(PHD_RESTRICTIONS_STR),
+        "change_load": startswith(LOAD_AVAILABILITY_STR),
+        "bs_list": startswith(BS_STR),
+        "ms_list": startswith(MS_STR),
+    }
+    # Be careful! This assumes there are TWO text boxes for available workload percentage
+    survey_columns["decreased_load"] = survey_columns["change_load"] + 1
+    survey_columns["increased_load"] = survey_columns["change_load"] + 2
+    # BE careful! This assumes there is ONE open text columns for bachelors preferences
+    survey_columns["bs_first"] = survey_columns["bs_list"] + 1
+    # BE careful! This assumes there are TWO open text columns for master preferences
+    survey_columns["ms_text"] = survey_columns["ms_list"] + 1
+    survey_columns["ms_first"] = survey_columns["ms_list"] + 2
+    return survey_columns
+
+# Extract the course ID ("CODE || NAME || TERM || LANGUAGE") from a survey column name
+def survey_course_id(column_name):
+    parts = column_name.split(' || ')
+    question_parts = parts[0].split(' - ')
+    return question_parts[3] + " || " + question_parts[4] + " || " + parts[1] + " || " + parts[2].split(' - ')[0]
+
+# PART 3.1: Cleaning the data
+###############################################################
+def clean_preferences(preferences_df, zero_contracts, faculty_list):
+    # Rename the column to "TA"
+    preferences_df = preferences_df.rename(columns={EMAIL_STR: 'TA'})
+
+    cols = locate_survey_columns(preferences_df.columns)
+
+    # Convert the values in the "TA" column to lowercase
+    preferences_df['TA'] = preferences_df['TA'].str.lower()
+
+    # Remove TAs with zero_contracts
+    preferences_df = preferences_df[~preferences_df["TA"].isin(zero_contracts)]
+
+    # Remove TAs wicha are faculty
+    preferences_df = preferences_df[~preferences_df["TA"].isin(faculty_list)]
+
+    # Merge the submissions of each TA into one row: the latest non-empty answer of each standalone question, and the
+    # questions answered together (the course preferences, the availability question with its two text boxes, the
+    # intention to continue with its justification) from the latest submission which answered them, so that answers
+    # of different submissions are never mixed. Submissions are ordered by "End Date" (on ties, the lower row of the
+    # export is the latest one)
+    preferences_df = preferences_df.iloc[::-1].sort_values(by='End Date', ascending=False, kind='stable').reset_index(drop=True)
+    preference_positions = list(range(cols["bs_first"], cols["ms_list"])) + list(range(cols["ms_first"], preferences_df.shape[1] - 1))
+    preference_columns = preferences_df.columns[preference_positions].tolist()
+    ta_codes = pd.factorize(preferences_df['TA'], use_na_sentinel=False)[0]
+    rows = pd.Series(np.arange(len(preferences_df)))
+    latest_rows = rows.groupby(ta_codes, sort=False).first()
+    answer_groups = [
+        (preference_positions, preference_positions),
+        ([cols["change_load"], cols["decreased_load"], cols["increased_load"]], [cols["change_load"]]),
+        ([cols["continue"], cols["continue_just"]], [cols["continue"]]),
+    ]
+    preferences_df_final = preferences_df.groupby(ta_codes, sort=False).first().reset_index(drop=True)
+    for positions, answer_positions in answer_groups:
+        # Latest submission of each TA which answered the group (the latest submission if none did)
+        answered = pd.notna(preferences_df.iloc[:, answer_positions].to_numpy()).any(axis=1)
+        group_rows = rows.where(answered).groupby(ta_codes, sort=False).first().fillna(latest_rows).to_numpy(dtype=int)
+        preferences_df_final.iloc[:, positions] = preferences_df.iloc[group_rows, positions].to_numpy()
+
+    # Drop duplicates based on the "Full Name" column while keeping the row with the most recent "End Date" (ex. Franziska wrong )
+    preferences_df_final = preferences_df_final.drop_duplicates(subset='Full Name', keep='first')
+
+    # Rename the course columns using the course ID
+    mapping = {column_name: survey_course_id(column_name) for column_name in preference_columns}
+    preferences_df_final.rename(columns=mapping, inplace=True)
+
+    # Drop columns with list of courses (redundant)
+    preferences_df_final.drop(columns=preferences_df_final.iloc[:,[cols["bs_list"], cols["ms_list"], cols["ms_text"]]], inplace=True)
+
+    # TAs leaving this semester (see OUTPUT #2)
+    leaving = preferences_df_final[preferences_df_final.iloc[:, cols["continue"]] == "No"]
+
+    # Filter the DataFrame for rows where "Do you intend to continue your collaboration with Nova SBE next semester as Teaching Assistant?" is not equal to "No"
+    preferences_df_final = preferences_df_final[preferences_df_final.iloc[:, cols["continue"]] != "No"]
+
+    return {
+        "preferences_df_final": preferences_df_final,
+        "survey_columns": cols,
+        "leaving": leaving,
+    }
+
+# Reshape the survey into a long TA x course table of ranked preferences, in a single pass over the course columns
+def reshape_preferences(preferences_df_final, survey_columns):
+    # Get the course columns (the list columns were dropped, so they start at the BS list position)
+    course_columns = preferences_df_final.columns[survey_columns["bs_list"]:-1].tolist()
+    values = preferences_df_final.iloc[:, survey_columns["bs_list"]:-1].to_numpy(dtype=object)
+
+    # Column positions of each course (the same course can be listed more than once in the survey)
+    positions = {}
+    for position, course in enumerate(course_columns):
+        positions.setdefault(course, []).append(position)
+    courses = list(positions)
+
+    # A course also collects the columns whose name ends with its own (ex. "1123 || X" for "123 || X"),
+    # after its own columns and in column order
+    suffix_columns = {}
+    for column in course_columns:
+        for start in range(1, len(column)):
+            if column[start:] in positions:
+                suffix_columns.setdefault(column[start:], []).extend(positions[column])
+
+    # Combine the duplicate columns into a single column, keeping the last answered one
+    combined = np.empty((len(values), len(courses)), dtype=object)
+    for i, course in enumerate(courses):
+        duplicate_positions = positions[course] + suffix_columns.get(course, [])
+        combined_column = values[:, duplicate_positions[0]]
+        for position in duplicate_positions[1:]:
+            column = values[:, position]
+            combined_column = np.where(pd.notnull(column), column, combined_column)
+        combined[:, i] = combined_column
+
+    # Stack course by course (courses in survey order, TAs in survey order within each course)
+    stacked = combined.T.ravel()
+    non_null_mask = pd.notnull(stacked)
+    preference_types = preferences_df_final.iloc[:, survey_columns["bs_or_ms"]].map(PREFERENCE_TYPE_MAPPING).to_numpy()
+    course_names = np.repeat(np.array(courses, dtype=object), len(values))[non_null_mask]
+
+    adapted_df = pd.DataFrame({
+        "TA": np.tile(preferences_df_final["TA"].to_numpy(dtype=object), len(courses))[non_null_mask],
+        "course": course_names,
+        "preference": stacked[non_null_mask],
+        "preference_type": np.tile(preference_types, len(courses))[non_null_mask],
+        "masters_course": np.repeat(workload.masters_course_flag(courses), len(values))[non_null_mask],
+    })
+
+    # Convert "preference" column to integers
+    adapted_df['preference'] = adapted_df['preference'].astype(np.int8)
+
+    # Remove preferences above 5
+    return compact_market(adapted_df[adapted_df['preference']<=5].reset_index(drop=True))
+
+# PART 3.2: Checking contract changes requested
+###############################################################
+def compute_contract_changes(preferences_df_final, survey_columns, contract, parameters=workload.DEFAULT_PARAMETERS):
+    cols = survey_columns
+    mask = preferences_df_final.iloc[:, cols["change_load"]].notna()
+    new_contract = preferences_df_final[mask].iloc[:, [cols["ta"], cols["ms_student"], cols["phd_restrictions"], cols["change_load"], cols["decreased_load"], cols["increased_load"]]].copy()
+
+    new_contract.columns = ['TA', 'master_student', 'PhD_restrictions', 'change_load', 'new_contract_decreased_load', 'new_contract_increased_load']
+    new_contract['change_load'] = new_contract['change_load'].map(CHANGE_LOAD_MAPPING)
+    new_contract['master_student'] = new_contract['master_student'].map(MS_STUDENT_MAPPING).fillna(0).astype(int)
+    new_contract['PhD_restrictions'] = new_contract['PhD_restrictions'].map(PHD_RESTRICTIONS_MAPPING).fillna(0).astype(int)
+
+    # Convert TA column to lowercase
+    new_contract['TA'] = new_contract['TA'].str.lower()
+
+    # Parse the contract percentages typed by the TAs (see load_requests.py)
+    decreased_load, decreased_issues = load_requests.parse_loads(new_contract['new_contract_decreased_load'])
+    increased_load, increased_issues = load_requests.parse_loads(new_contract['new_contract_increased_load'])
+
+    # OUTPUT #15: CONTRACT PERCENTAGES WHICH COULD NOT BE PARSED
+    output_15 = load_requests.issues_report(new_contract['TA'], {
+        "Decreased load": (new_contract['new_contract_decreased_load'], decreased_issues),
+        "Increased load": (new_contract['new_contract_increased_load'], increased_issues),
+    })
+
+    # Merge "new_contract_decreased_load" and "new_contract_increased_load" into "load_requested"
+    new_contract['load_requested'] = load_requests.requested_load(decreased_load, increased_load)
+
+    # Drop "new_contract_decreased_load" and "new_contract_increased_load" columns
+    new_contract.drop(columns=['new_contract_decreased_load', 'new_contract_increased_load'], inplace=True)
+
+    all_contracts = contract.merge(new_contract, how="left", on="TA")
+
+    # Filter rows where change_load is not equal to 0
+    filtered_contracts = all_contracts[all_contracts['change_load'] != 0].copy()
+
+    # Decrease contract to load_requested for rows where change_load is -1
+    filtered_contracts.loc[filtered_contracts['change_load'] == -1, 'new_contract'] = filtered_contracts['load_requested']
+    filtered_contracts.loc[(filtered_contracts['change_load'] == -1) & (filtered_contracts['load_requested'].isnull()), 'new_contract'] = workload.decreased_contract(filtered_contracts['CONTRACT'], workload.parameter(parameters, "contract_level"))
+
+    # Fill NaN values with the original contract value
+    filtered_contracts['new_contract'] = filtered_contracts['new_contract'].fillna(filtered_contracts['CONTRACT'])
+
+    # Create a new column "new_contract" in the original DataFrame with NaN values
+    all_contracts['new_contract'] = np.nan
+
+    # Update the "new_contract" column in the original DataFrame with the filtered values
+    all_contracts.update(filtered_contracts[['new_contract']])
+    all_contracts['new_contract'] = all_contracts['new_contract'].fillna(all_contracts['CONTRACT'])
+
+    # Drop emails which currently do not have a contract (ex. pedro.brinca)
+    all_contracts = all_contracts[all_contracts.CONTRACT.notna()]
+
+    # CHANGED! Drop columns which are not needed
+    all_contracts = all_contracts[["TA", "new_contract", "master_student"]]
+
+    return {
+        "new_contract": new_contract,
+        "all_contracts": all_contracts,
+        "output_15": output_15,
+    }
+
+
+# PART 4: FINAL DATA
+#########################################################################################################################################
+
+# PART 4.1: Merge all dataframes
+###############################################################
+def build_market(adapted_df, all_contracts, course_demand, course_catalog, bs_weights_df, parameters=workload.DEFAULT_PARAMETERS):
+    market = adapted_df.merge(all_contracts, how="left", on="TA")
+
+    # Survey courses get an ID in the catalog (after the DSD courses if they are not in the DSD)
+    course_catalog = catalog.extend_catalog(course_catalog, adapted_df["course"].unique())
+    market["survey_course_id"] = catalog.course_ids(course_catalog, market["course"])
+
+    # Match the survey courses to the DSD courses in one pass over hash indexes (exact key, then code/name/period/language
+    # combinations, then normalized and fuzzy names), with the method and confidence of each match
+    course_matches = matching.match_courses(market["survey_course_id"], course_catalog)
+
+    # Merge the matches used in the allocation (fuzzy matches are only reported, see OUTPUT #14) on the market DataFrame
+    # to add the "course_id" column (the survey course when not matched)
+    market = pd.merge(market, matching.used_matches(course_matches), on=["survey_course_id"], how="left")
+    market["course_id"] = market["course_id"].fillna(market["survey_course_id"]).astype(np.int64)
+    market["course"] = catalog.lookup(course_catalog, market["course_id"], "course")
+
+    # Number of classes and students of the DSD courses (the DSD course IDs are the positions in course_demand)
+    dsd_course = (market["course_id"] < len(course_demand)).to_numpy()
+    dsd_position = np.where(dsd_course, market["course_id"], 0)
+    merged_market = market
+    merged_market["number_classes"] = np.where(dsd_course, course_demand["number_classes"].to_numpy(dtype=float)[dsd_position], np.nan)
+    merged_market["number_students"] = np.where(dsd_course, course_demand["number_students"].to_numpy(dtype=float)[dsd_position], np.nan)
+
+    # OUTPUT #8: COURSES FROM SURVEY (QUALTRICS) WITHOUT MATCH IN COURSE LIST (DSD)
+    no_matches_final = merged_market[(merged_market.number_classes.isna()) | (merged_market.number_students.isna())][["course"]]
+    output_8 = no_matches_final.drop_duplicates()
+
+    # Drop these courses
+    merged_market.dropna(subset=["number_classes", "number_students"], inplace=True)
+
+    # PART 4.2: Compute capacities
+    ###############################################################
+    # Create the "semester" column based on the condition
+    merged_market['semester'] = catalog.lookup(course_catalog, merged_market['course_id'], 'semester')
+
+    merged_market['weight'] = workload.ms_course_weight(merged_market['number_students'], merged_market['semester'], merged_market['masters_course'], **workload.ms_hours(parameters))
+
+    # Final table
+    final_market = pd.merge(merged_market, bs_weights_df, on=["course"], how="left", suffixes=("", "_bs"))
+    final_market.rename(columns={"new_contract": "capacity"}, inplace=True)
+    final_market["weight"] = final_market["weight"].fillna(final_market["weight_bs"] * final_market["number_classes"])
+    final_market.drop(columns=["weight_bs"], inplace=True)
+    final_market = compact_market(final_market)
+
+    # OUTPUT #14: SURVEY COURSES MATCHED TO A DIFFERENT DSD COURSE (method and confidence of the match, and whether it
+    # is used in the allocation: the fuzzy matches are only suggestions to review, their survey courses are in OUTPUT #8)
+    output_14 = course_matches[course_matches["match_method"] != "exact"]
+    output_14 = pd.DataFrame({
+        "SURVEY COURSE": catalog.lookup(course_catalog, output_14["survey_course_id"], "course"),
+        "COURSE": catalog.lookup(course_catalog, output_14["course_id"], "course"),
+        "MATCH METHOD": output_14["match_method"].to_numpy(),
+        "MATCH CONFIDENCE": output_14["match_confidence"].to_numpy(),
+        "USED IN ALLOCATION": ~output_14["match_method"].isin(matching.REVIEW_ONLY).to_numpy(),
+    }).sort_values(by=["MATCH CONFIDENCE", "SURVEY COURSE"])
+
+    return {
+        "final_market": final_market,
+        "output_8": output_8,
+        "output_14": output_14,
+    }
+
+
+# Part 5: ALLOCATION
+#########################################################################################################################################
+# Select "easy" allocations (first preferences) for MS and BS, sorted in allocation order.
+# IMPORTANT: the ascending order is important especially for preference_type which differes from BS and MS
+def select_first_preferences(final_market):
+    ms_courses = final_market[(final_market['masters_course'] == 1) & (final_market['master_student'] == 0) & ((final_market['preference_type'] == 2) | (final_market['preference_type'] == 1)) & (final_market['preference'] == 1)]
+    ms_courses = ms_courses.sort_values(by=["course", "preference_type", "preference"], ascending=[True, False, True])
+
+    bs_courses = final_market[(final_market['masters_course'] == 0) & ((final_market['preference_type'] == 0) | (final_market['preference_type'] == 1)) & (final_market['preference'] == 1)]
+    bs_courses = bs_courses.sort_values(by=["course", "preference_type", "preference"], ascending=[True, True, True])
+
+    return bs_courses, ms_courses
+
+def allocate(final_market):
+    bs_courses, ms_courses = select_first_preferences(final_market)
+
+    # Integer-encode TAs and courses, with the capacity of each TA
+    tas = allocation.encode(final_market['TA'])[1]
+    courses = allocation.encode(final_market['course'])[1]
+    ta_position = pd.Index(tas)
+    course_position = pd.Index(courses)
+    ta_capacity = final_market[['TA', 'capacity']].drop_duplicates()
+    capacity = allocation.last_value_per_code(ta_position.get_indexer(ta_capacity['TA']), ta_capacity['capacity'], len(tas))
+
+    # Allocation algorithm (BS first, then MS, sharing the TAs capacity)
+    ta_allocations = []
+    remaining_needs = []
+    for selected in (bs_courses, ms_courses):
+        selected_ta_codes = ta_position.get_indexer(selected['TA'])
+        selected_course_codes = course_position.get_indexer(selected['course'])
+        need = allocation.last_value_per_code(selected_course_codes, selected['weight'], len(courses))
+
+        rows, loads = allocation.greedy_allocation(selected_ta_codes, selected_course_codes, capacity, need)
+        ta_allocations += list(zip(tas[selected_ta_codes[rows]], courses[selected_course_codes[rows]], loads))
+
+        # Remaining needs of the courses in this selection
+        selected_courses = pd.unique(selected_course_codes)
+        remaining_needs.append(dict(zip(courses[selected_courses], need[selected_courses])))
+
+    bs_courses_dict, ms_courses_dict = remaining_needs
+    return {
+        "ta_allocations": ta_allocations,
+        "bs_courses_dict": bs_courses_dict,
+        "ms_courses_dict": ms_courses_dict,
+        "remaining_capacity": dict(zip(tas, capacity)),
+    }
+
+# OUPUT #10: COURSE NEEDS
+def compute_course_needs(full_courses, bs_weights_df, bs_courses_dict, ms_courses_dict, parameters=workload.DEFAULT_PARAMETERS):
+    # Get full course list
+    full_course_weights = full_courses.merge(bs_weights_df, on="course", how="left")
+    full_course_weights.rename(columns={"course": "COURSE"}, inplace=True)
+
+    # Number of classes times the weight for "BSC", hours-based weight for "MST"
+    full_course_weights["INITIAL NEEDS"] = workload.course_initial_needs(full_course_weights["TERM"], full_course_weights["CYCLE"], full_course_weights["SLOTS"], full_course_weights["CLASS"], full_course_weights["weight"], **workload.ms_hours(parameters))
+    full_course_weights.drop(columns="weight", inplace=True)
+
+    # One row per course (the first one), so that every column stays aligned with its course
+    course_needs = full_course_weights.drop_duplicates(subset="COURSE", keep="first").reset_index(drop=True)
+    course_needs = course_needs.rename(columns={"CLASS": "CLASSES"})[["CYCLE", "COURSE", "TERM", "CLASSES", "SLOTS", "INITIAL NEEDS"]]
+
+    # Join the remaining needs after the allocation (MS first, then BS); courses not allocated keep their initial needs
+    remaining_needs = pd.Series({**bs_courses_dict, **ms_courses_dict}, dtype=float)
+    allocated_mask = course_needs["COURSE"].isin(remaining_needs.index)
+    course_needs["NEEDS"] = np.where(allocated_mask, remaining_needs.reindex(course_needs["COURSE"]).to_numpy(), course_needs["INITIAL NEEDS"])
+
+    # Add the MATCH column based on the conditions
+    course_needs.loc[course_needs["CYCLE"] == "ME", "MATCH"] = "NO"
+    course_needs.loc[course_needs["INITIAL NEEDS"] == course_needs["NEEDS"], "MATCH"] = "NO"
+    course_needs.loc[(course_needs["INITIAL NEEDS"] != course_needs["NEEDS"]) & (course_needs["NEEDS"] > 0), "MATCH"] = "PARTIAL"
+    course_needs.loc[(course_needs["INITIAL NEEDS"] != course_needs["NEEDS"]) & (course_needs["NEEDS"] == 0), "MATCH"] = "MATCHED"
+
+    return course_needs
+
+# OUPUT #11: TA ALLOCATIONS
+def format_allocations(ta_allocations, ms_courses_dict):
+    ta_allocations_df = pd.DataFrame(ta_allocations, columns=["TA", "COURSE", "LOAD"])
+    ta_allocations_df["CYCLE"] = ta_allocations_df["COURSE"].apply(lambda x: "MST" if x in ms_courses_dict else "BSC")
+    return ta_allocations_df[['CYCLE', 'COURSE', 'TA', 'LOAD']]
+
+
+# OPTIMAL ALLOCATION (min-cost flow over preferences 1 to 5)
+###############################################################
+# Cost per unit of load: the preference rank, plus a penalty when the TA is indifferent between BS and MS
+MAX_PREFERENCE_RANK = 5
+INDIFFERENT_COST = 0.5
+# Cost per unit of unmet need (higher than any preference cost, so covering the needs comes first)
+UNMET_NEED_COST = 10
+
+# Preferences eligible for allocation: same BS/MS rules as the greedy allocation, for ranks 1 to 5
+def select_ranked_preferences(final_market, max_rank=MAX_PREFERENCE_RANK):
+    bs_mask = (final_market['masters_course'] == 0) & ((final_market['preference_type'] == 0) | (final_market['preference_type'] == 1))
+    ms_mask = (final_market['masters_course'] == 1) & (final_market['master_student'] == 0) & ((final_market['preference_type'] == 2) | (final_market['preference_type'] == 1))
+    ranked = final_market[(bs_mask | ms_mask) & (final_market['preference'] >= 1) & (final_market['preference'] <= max_rank)].copy()
+    ranked['cost'] = ranked['preference'] + INDIFFERENT_COST * (ranked['preference_type'] == 1)
+    return ranked
+
+def optimal_allocate(final_market):
+    ranked = select_ranked_preferences(final_market)
+
+    ta_codes, tas = allocation.encode(ranked['TA'])
+    course_codes, courses = allocation.encode(ranked['course'])
+    ta_capacity = ranked[['TA', 'capacity']].drop_duplicates()
+    capacity = allocation.last_value_per_code(pd.Index(tas).get_indexer(ta_capacity['TA']), ta_capacity['capacity'], len(tas))
+    need = allocation.last_value_per_code(course_codes, ranked['weight'], len(courses))
+
+    loads, _ = allocation.min_cost_allocation(ta_codes, course_codes, ranked['cost'].to_numpy(), capacity, need, UNMET_NEED_COST)
+
+    allocated = ranked.assign(LOAD=loads)[loads > 0]
+    allocated = allocated.groupby(['course', 'TA'], sort=False, observed=True).agg(LOAD=('LOAD', 'sum'), masters_course=('masters_course', 'first')).reset_index()
+    allocated['CYCLE'] = np.where(allocated['masters_course'] == 1, "MST", "BSC")
+    allocated = uncategorize(allocated).rename(columns={'course': 'COURSE'}).sort_values(by=['CYCLE', 'COURSE', 'TA'])
+    return allocated[['CYCLE', 'COURSE', 'TA', 'LOAD']]
+
+# GREEDY ALLOCATION BY ROUNDS (preferences 1 to 5)
+###############################################################
+# Round after round, the greedy allocation of the preferences of one rank (BS courses first, then MS courses, in the
+# order of the greedy allocation), so that a TA whose first choice is full can still get a later one. The first round
+# is the greedy allocation of first preferences (OUTPUT #11).
+def ranked_allocate(final_market):
+    ranked = select_ranked_preferences(final_market)
+
+    ta_codes, tas = allocation.encode(ranked['TA'])
+    course_codes, courses = allocation.encode(ranked['course'])
+    ta_capacity = ranked[['TA', 'capacity']].drop_duplicates()
+    capacity = allocation.last_value_per_code(pd.Index(tas).get_indexer(ta_capacity['TA']), ta_capacity['capacity'], len(tas))
+    need = allocation.last_value_per_code(course_codes, ranked['weight'], len(courses))
+
+    # Priority of the rows: rank, BS before MS, course, then BS-only TAs first for BS courses and MS-only TAs first for MS courses
+    order = pd.DataFrame({
+        "preference": ranked['preference'].to_numpy(),
+        "masters_course": ranked['masters_course'].to_numpy(),
+        "course": ranked['course'].to_numpy(),
+        "preference_type": np.where(ranked['masters_course'] == 1, -ranked['preference_type'], ranked['preference_type']),
+    }).sort_values(by=["preference", "masters_course", "course", "preference_type"]).index.to_numpy()
+    rounds = ranked['preference'].to_numpy()[order] * 2 + ranked['masters_course'].to_numpy()[order]
+
+    rows, loads = allocation.round_allocation(ta_codes[order], course_codes[order], rounds, capacity, need)
+    rows = order[rows]
+    allocated = pd.DataFrame({
+        "CYCLE": np.where(ranked['masters_course'].to_numpy()[rows] == 1, "MST", "BSC"),
+        "COURSE": courses[course_codes[rows]],
+        "TA": tas[ta_codes[rows]],
+        "LOAD": loads,
+        "RANK": ranked['preference'].to_numpy()[rows].astype(np.int64),
+    })
+    return allocated
+
+# STABLE ALLOCATION (capacitated deferred acceptance over preferences 1 to 5)
+###############################################################
+# The TAs propose their capacity to the courses in their preference order (rank, BS before MS); the courses keep the
+# BS-only (MS-only) TAs before the indifferent ones, then the TAs who ranked them higher, up to their need. Unlike the
+# greedy allocation, the result does not depend on the alphabetical order of the courses.
+def stable_allocate(final_market):
+    # One row per TA and course (its best rank)
+    ranked = select_ranked_preferences(final_market).sort_values(by=["preference"], kind="stable").drop_duplicates(subset=["TA", "course"])
+
+    ta_codes, tas = allocation.encode(ranked['TA'])
+    course_codes, courses = allocation.encode(ranked['course'])
+    ta_capacity = ranked[['TA', 'capacity']].drop_duplicates()
+    capacity = allocation.last_value_per_code(pd.Index(tas).get_indexer(ta_capacity['TA']), ta_capacity['capacity'], len(tas))
+    need = allocation.last_value_per_code(course_codes, ranked['weight'], len(courses))
+    rank = ranked['preference'].to_numpy()
+    masters_course = ranked['masters_course'].to_numpy()
+    indifferent = (ranked['preference_type'] == 1).to_numpy()
+
+    ta_order = np.lexsort((course_codes, masters_course, rank, ta_codes))
+    course_priority = np.empty(len(ranked), dtype=np.int64)
+    course_priority[np.lexsort((ta_codes, rank, indifferent, course_codes))] = np.arange(len(ranked))
+    loads = allocation.deferred_acceptance(ta_codes, course_codes, ta_order, course_priority, capacity, need)
+
+    rows = ta_order[loads[ta_order] > 0]
+    allocated = pd.DataFrame({
+        "CYCLE": np.where(masters_course[rows] == 1, "MST", "BSC"),
+        "COURSE": courses[course_codes[rows]],
+        "TA": tas[ta_codes[rows]],
+        "LOAD": loads[rows],
+        "RANK": rank[rows].astype(np.int64),
+    })
+    return allocated.sort_values(by=["CYCLE", "COURSE", "TA"]).reset_index(drop=True)
+
+# Total preference cost and unmet need of an allocation (CYCLE, COURSE, TA, LOAD) over the ranked preferences
+def summarize_allocation(ta_allocations_df, final_market):
+    ranked = select_ranked_preferences(final_market)
+    costs = ranked.groupby(['TA', 'course'], observed=True)['cost'].min().rename('cost').reset_index().rename(columns={'course': 'COURSE'})
+    allocated = ta_allocations_df.merge(costs, on=['TA', 'COURSE'], how='left')
+
+    needs = ranked.groupby('course', observed=True)['weight'].last()
+    covered = allocated.groupby('COURSE')['LOAD'].sum().reindex(needs.index, fill_value=0)
+    return {
+        "ALLOCATED LOAD": allocated['LOAD'].sum(),
+        "PREFERENCE COST": (allocated['LOAD'] * allocated['cost']).sum(),
+        "UNMET NEED": (needs.fillna(0) - covered).clip(lower=0).sum(),
+    }
+
+# Allocation modes: the greedy allocation of first preferences (OUTPUT #11) is always run; any other mode adds its own
+# allocation table (same columns) and its comparison with the greedy one (OUTPUT #13)
+ALLOCATION_MODES = {
+    "greedy": "Greedy (first preferences)",
+    "ranked": "Greedy by rounds (preferences 1-5)",
+    "stable": "Stable matching (preferences 1-5)",
+    "optimal": "Optimal (preferences 1-5)",
+}
+ALTERNATIVE_ALLOCATIONS = {
+    "ranked": ("output_16", ranked_allocate),
+    "stable": ("output_17", stable_allocate),
+    "optimal": ("output_12", optimal_allocate),
+}
+
+# OUTPUTS #10 AND #11: COURSE NEEDS AND TA ALLOCATIONS (after the greedy allocation)
+def course_reports(courses, bs_weights_df, allocation, parameters=workload.DEFAULT_PARAMETERS):
+    return {
+        "output_10": compute_course_needs(courses["full_courses"], bs_weights_df, allocation["bs_courses_dict"], allocation["ms_courses_dict"], parameters),
+        "output_11": format_allocations(allocation["ta_allocations"], allocation["ms_courses_dict"]),
+    }
+
+# ANALYSIS REPORTS: computed on demand (see stages.py), from the results of the stages
+###############################################################
+# OUTPUT #2: TAs LEAVING THIS SEMESTER
+def leaving_tas(preferences):
+    cols = preferences["survey_columns"]
+    output_2 = preferences["leaving"].iloc[:, [cols["full_name"], cols["ta"], cols["continue_just"]]]
+    return output_2.rename(columns={output_2.columns[-1]: "Comments"}).sort_values("Full Name").reset_index(drop=True)
+
+# OUTPUT #3: TAs COMMENTS
+def ta_comments(preferences):
+    cols = preferences["survey_columns"]
+    preferences_df_final = preferences["preferences_df_final"]
+    return preferences_df_final[~preferences_df_final.iloc[:,-1].isna()].iloc[:, [cols["full_name"], cols["ta"], -1]].reset_index(drop=True)
+
+# OUTPUT #4: TAs EMAILS FROM SURVEY WHICH ARE NOT IN THE TA CONTRACT DATABASE
+def unmatched_emails(preferences, contracts):
+    preferences_df_final = preferences["preferences_df_final"]
+    return preferences_df_final[~preferences_df_final["TA"].isin(contracts["contract_emails"])][["TA", "Full Name"]].reset_index(drop=True)
+
+# OUTPUT #6: TAs TO CONTACT (WHO DID NOT FILL-IN THE SURVEY AND ARE NOT LEAVING)
+def tas_to_contact(contracts, preferences, adapted_df):
+    contract = contracts["contract"]
+    completed_preferences = adapted_df["TA"].unique()
+    return contract[(~contract.TA.isin(completed_preferences)) & (~contract.TA.isin(preferences["leaving"]["TA"]))].reset_index(drop=True)
+
+# OUTPUT #7: TAs WHO WANT TO CHANGE THEIR CONTRACT
+def contract_change_requests(contract_changes):
+    new_contract = contract_changes["new_contract"]
+    return new_contract[new_contract.change_load !=0].sort_values(by=["change_load", "TA"]).reset_index(drop=True)
+
+# OUTPUT #9: TAs AFFECTED BY COURSES WHICH ARE NOT MATCHED ON THE COURSE LIST (DSD)
+def affected_tas(adapted_df, market):
+    completed_preferences = np.asarray(adapted_df["TA"].unique(), dtype=object)
+    return pd.DataFrame(np.setdiff1d(completed_preferences, market["final_market"].TA.unique()), columns=["TA"])
+
+# Outputs in the order of their numbers
+def ordered_outputs(outputs):
+    return dict(sorted(outputs.items(), key=lambda item: int(item[0].split("_")[1])))
+
+# Main output tables (all but the analysis reports) from the results of the stages (see stages.STAGES)
+def main_outputs(cleaned, allocated, allocation_mode="greedy"):
+    adapted_df = cleaned["adapted_df"]
+    final_market = allocated["market"]["final_market"]
+
+    # OUTPUT #5: TAs COURSE PREFERENCES
+    output_5 = uncategorize(adapted_df).astype({
+        "preference_type": np.float64 if adapted_df["preference_type"].dtype.kind == "f" else np.int64,
+        "masters_course": np.int64,
+    })
+
+    outputs = {
+        "output_1": cleaned["courses"]["output_1"],
+        "output_5": output_5,
+        "output_8": allocated["market"]["output_8"],
+        "output_10": allocated["output_10"],
+        "output_11": allocated["output_11"],
+        "output_14": allocated["market"]["output_14"],
+        "output_15": allocated["contract_changes"]["output_15"],
+    }
+
+    if allocation_mode in ALTERNATIVE_ALLOCATIONS:
+        # OUTPUT #12 (OPTIMAL), #16 (BY ROUNDS) OR #17 (STABLE): ALLOCATION RESULTS OF THE SELECTED MODE
+        output_name, allocate_mode = ALTERNATIVE_ALLOCATIONS[allocation_mode]
+        outputs[output_name] = allocate_mode(final_market)
+        # OUTPUT #13: GREEDY VS SELECTED ALLOCATION
+        outputs["output_13"] = pd.DataFrame([
+            {"ALLOCATION": ALLOCATION_MODES["greedy"], **summarize_allocation(outputs["output_11"], final_market)},
+            {"ALLOCATION": ALLOCATION_MODES[allocation_mode], **summarize_allocation(outputs[output_name], final_market)},
+        ])
+
+    return ordered_outputs({name: output.reset_index(drop=True) for name, output in outputs.items()})
+
+# Full pipeline: from the four uploaded files to the output tables ("output_1" ... "output_11").
+# With allocation_mode="optimal" (or "ranked", "stable"), also the optimal allocation ("output_12", or the allocation by
+# rounds "output_16", the stable allocation "output_17") and its comparison with the greedy one ("output_13").
+# "parameters" overrides the workload parameters (see workload.DEFAULT_PARAMETERS)
+def run_pipeline(dsd_df, bs_weights_df, contract, preferences_df, term, allocation_mode="greedy", parameters=workload.DEFAULT_PARAMETERS):
+    # The stages are defined in stages.py (which imports this module); each call runs all of them again
+    from ta_allocation import stages
+    return stages.run_pipeline(dsd_df, bs_weights_df, contract, preferences_df, term, allocation_mode, parameters, memo={})
@@ -0,0 +1,128 @@
+# Export of the output tables: in-memory files for the app downloads, or files in a directory for the command line
+import io
+import os
+import zipfile
+
+import pandas as pd
+import xlsxwriter
+
+XLSX_MIME = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+
+# Serialize a table into the bytes of an Excel file
+def to_excel_bytes(df):
+    buffer = io.BytesIO()
+    df.to_excel(buffer, index=False, engine="xlsxwriter")
+    return buffer.getvalue()
+
+# Serialize a table into the bytes of a Parquet file
+def to_parquet_bytes(df):
+    # Text columns as strings (object columns with mixed types cannot be written to Parquet)
+    object_columns = df.select_dtypes(include="object").columns
+    return df.astype({column: "string" for column in object_columns}).to_parquet(index=False)
+
+# File/sheet names of the output tables in the bulk exports (sheet names are limited to 31 characters)
+OUTPUT_NAMES = {
+    "output_1": "course_list",
+    "output_2": "tas_leaving",
+    "output_3": "tas_comments",
+    "output_4": "unmatched_ta_emails",
+    "output_5": "ta_course_preferences",
+    "output_6": "tas_to_call",
+    "output_7": "tas_contract_changes",
+    "output_8": "unmatched_courses",
+    "output_9": "tas_affected_unmatched_courses",
+    "output_10": "course_needs",
+    "output_11": "ta_allocations_auto",
+    "output_12": "ta_allocations_optimal",
+    "output_13": "allocation_comparison",
+    "output_14": "course_matches",
+    "output_15": "unparseable_load_requests",
+    "output_16": "ta_allocations_ranked",
+    "output_17": "ta_allocations_stable",
+}
+
+# Bulk export formats: file extension and MIME type
+EXPORT_FORMATS = {
+    "xlsx": ("xlsx", XLSX_MIME),
+    "xlsx (no styling)": ("xlsx", XLSX_MIME),
+    "csv (zip)": ("zip", "application/zip"),
+    "parquet (zip)": ("zip", "application/zip"),
+}
+
+
+# Output tables keyed by their export name
+def named_tables(outputs):
+    return {OUTPUT_NAMES.get(key, key): df for key, df in outputs.items()}
+
+# Write every table as a sheet of a single workbook, in one pass (XlsxWriter engine).
+# Without styling, the cells are written directly with XlsxWriter in constant memory mode, skipping the pandas
+# cell formatter (bold headers, borders and merged cells).
+def to_excel_workbook_bytes(tables, styled=True):
+    buffer = io.BytesIO()
+    if styled:
+        with pd.ExcelWriter(buffer, engine="xlsxwriter") as writer:
+            for sheet_name, df in tables.items():
+                df.to_excel(writer, sheet_name=sheet_name[:31], index=False)
+        return buffer.getvalue()
+
+    workbook = xlsxwriter.Workbook(buffer, {"in_memory": True, "constant_memory": True, "default_date_format": "yyyy-mm-dd hh:mm:ss"})
+    for sheet_name, df in tables.items():
+        worksheet = workbook.add_worksheet(sheet_name[:31])
+        worksheet.write_row(0, 0, [str(column) for column in df.columns])
+        values = df.astype(object).where(df.notna(), None)
+        for row, row_values in enumerate(values.itertuples(index=False), start=1):
+            worksheet.write_row(row, 0, row_values)
+    workbook.close()
+    return buffer.getvalue()
+
+# Zip bundle with one CSV or Parquet file per table (much cheaper to produce than xlsx)
+def to_zip_bytes(tables, file_format="csv"):
+    buffer = io.BytesIO()
+    # Parquet files are already compressed
+    compression = zipfile.ZIP_DEFLATED if file_format == "csv" else zipfile.ZIP_STORED
+    with zipfile.ZipFile(buffer, "w", compression=compression) as bundle:
+        for name, df in tables.items():
+            if file_format == "csv":
+                bundle.writestr(f"{name}.csv", df.to_csv(index=False))
+            else:
+                bundle.writestr(f"{name}.parquet", to_parquet_bytes(df))
+    return buffer.getvalue()
+
+# Bulk export of all the outputs in one of the EXPORT_FORMATS
+def export_all(outputs, export_format="xlsx"):
+    tables = named_tables(outputs)
+    if export_format == "xlsx":
+        return to_excel_workbook_bytes(tables)
+    elif export_format == "xlsx (no styling)":
+        return to_excel_workbook_bytes(tables, styled=False)
+    elif export_format == "csv (zip)":
+        return to_zip_bytes(tables, "csv")
+    elif export_format == "parquet (zip)":
+        return to_zip_bytes(tables, "parquet")
+    raise ValueError(f"Unknown export format: {export_format}")
+
+# Write every table to a directory: one file per table ("xlsx", "csv" or "parquet") or a single "workbook"
+def write_tables(tables, output_dir, file_format="xlsx"):
+    os.makedirs(output_dir, exist_ok=True)
+    if file_format == "workbook":
+        paths = [os.path.join(output_dir, "ta_allocation_outputs.xlsx")]
+        with open(paths[0], "wb") as file:
+            file.write(to_excel_workbook_bytes(tables))
+        return paths
+
+    paths = []
+    for name, df in tables.items():
+        path = os.path.join(output_dir, f"{name}.{file_format}")
+        if file_format == "xlsx":
+            with open(path, "wb") as file:
+                file.write(to_excel_bytes(df))
+        elif file_format == "csv":
+            df.to_csv(path, index=False)
+        elif file_format == "parquet":
+            with open(path, "wb") as file:
+                file.write(to_parquet_bytes(df))
+        else:
+            raise ValueError(f"Unknown file format: {file_format}")
+        paths.append(path)
+    return paths
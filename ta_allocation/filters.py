@@ -0,0 +1,79 @@
+# Indexes for the column/value filters and the sorting of the output tables: built once per table (see table_index),
+# then a filter on several values of a column or on a range of a numeric column, or a sort by a column, only looks up
+# row positions in the index, without scanning or converting the column again
+import pandas as pd
+import numpy as np
+
+# Numeric columns with at most this many distinct values (ex. 0/1 flags, ranks) are filtered by values, not ranges
+MAX_LISTED_NUMBERS = 10
+
+
+# Whether a column can be filtered by ranges (numbers, but not booleans)
+def is_numeric(column):
+    return pd.api.types.is_numeric_dtype(column) and not pd.api.types.is_bool_dtype(column)
+
+# Index of a column: its distinct values (sorted when comparable, missing values last), the value of each row (by its
+# position in "values"), the row positions grouped by value ("order", the rows of value i being
+# order[bounds[i]:bounds[i + 1]]) and, for numeric columns, the positions of the non-missing rows sorted by value with
+# their sorted values
+def column_index(column):
+    try:
+        codes, values = pd.factorize(column, sort=True, use_na_sentinel=False)
+    except TypeError:
+        # Values of different types (ex. text and numbers) which cannot be sorted
+        codes, values = pd.factorize(column, use_na_sentinel=False)
+    order = np.argsort(codes, kind="stable")
+    index = {
+        "values": list(values),
+        "codes": codes,
+        "order": order,
+        "bounds": np.searchsorted(codes[order], np.arange(len(values) + 1)),
+    }
+    if is_numeric(column):
+        positions = np.flatnonzero(column.notna().to_numpy())
+        numbers = column.iloc[positions].to_numpy(dtype=np.int64 if pd.api.types.is_integer_dtype(column) else np.float64)
+        by_value = np.argsort(numbers, kind="stable")
+        index["sorted_positions"] = positions[by_value]
+        index["sorted_values"] = numbers[by_value]
+    return index
+
+# Index of every column of a table, by column name
+def table_index(table):
+    return {name: column_index(table[name]) for name in table.columns}
+
+# Bounds of a numeric column filtered by ranges (None for a column filtered by values, see MAX_LISTED_NUMBERS)
+def value_range(index):
+    sorted_values = index.get("sorted_values")
+    if sorted_values is None or len(index["values"]) <= MAX_LISTED_NUMBERS:
+        return None
+    return sorted_values[0].item(), sorted_values[-1].item()
+
+# Row positions (in table order) of the values selected by their position in index["values"]
+def value_positions(index, selected):
+    bounds = index["bounds"]
+    return np.sort(np.concatenate([index["order"][bounds[i]:bounds[i + 1]] for i in selected]))
+
+# Row positions (in table order) of the values within [low, high]
+def range_positions(index, low, high):
+    sorted_values = index["sorted_values"]
+    start, end = np.searchsorted(sorted_values, low, side="left"), np.searchsorted(sorted_values, high, side="right")
+    return np.sort(index["sorted_positions"][start:end])
+
+# Row positions of the table sorted by the column (stable, missing values last; values which cannot be compared are
+# kept in the order in which they appear)
+def sorted_positions(index, descending=False):
+    if not descending:
+        return index["order"]
+    values, codes = index["values"], index["codes"]
+    ranks = len(values) - 1 - codes
+    if values and pd.isna(values[-1]):
+        ranks[codes == len(values) - 1] = len(values)
+    return np.argsort(ranks, kind="stable")
+
+# Summary statistics (count, mean, standard deviation, min, quartiles, max) of the numeric columns of a table, one row
+# per column
+def numeric_summary(table):
+    numeric = [name for name in table.columns if is_numeric(table[name])]
+    if not numeric:
+        return pd.DataFrame()
+    return table[numeric].describe().T
@@ -0,0 +1,80 @@
+# Ingestion of the Qualtrics survey export: only the columns used by the pipeline are parsed
+from operator import itemgetter
+
+import pandas as pd
+import numpy as np
+from pandas.io.parsers import TextParser
+
+from ta_allocation import engine
+
+# Faster Excel parser (Rust), if installed; openpyxl in read-only mode otherwise
+try:
+    from python_calamine import CalamineWorkbook
+except ImportError:
+    CalamineWorkbook = None
+
+
+# Iterate over the rows (sequences of cell values) of the first sheet of an Excel file
+def iter_sheet_rows(file):
+    if CalamineWorkbook is not None:
+        sheet = CalamineWorkbook.from_filelike(file).get_sheet_by_index(0)
+        # Empty cells are read as "" (converted to None by the caller, on the needed columns only)
+        yield from sheet.iter_rows()
+    else:
+        from openpyxl import load_workbook
+        workbook = load_workbook(file, read_only=True, data_only=True)
+        try:
+            yield from workbook.worksheets[0].iter_rows(values_only=True)
+        finally:
+            workbook.close()
+
+# Column names as pandas would read them ("Unnamed: N" for empty cells, ".1", ".2"... suffixes for duplicates)
+def header_names(header):
+    header = ["" if name is None else name for name in header]
+    return [str(name) for name in TextParser([header], header=0).read().columns]
+
+# Positions of the survey columns used by the pipeline, and the course preference columns among them
+def survey_column_positions(names):
+    columns = engine.locate_survey_columns(pd.Index(["TA" if name == engine.EMAIL_STR else name for name in names]))
+    end_date = names.index("End Date")
+    positions = sorted({end_date, *[columns[key] for key in ("full_name", "ta", "continue", "continue_just", "ms_student", "bs_or_ms",
+                                                            "phd_restrictions", "change_load", "decreased_load", "increased_load")]}
+                       | set(range(columns["bs_list"], len(names))))
+    course_positions = set(range(columns["bs_first"], columns["ms_list"])) | set(range(columns["ms_first"], len(names) - 1))
+    return positions, course_positions
+
+# Read the survey export: the first row holds the Qualtrics question IDs and the second one the questions (header=1).
+# The header is read first to resolve the needed column positions, then only those columns are kept, with explicit
+# dtypes: datetime for "End Date", float for the course preference ranks and object for the answers.
+def read_preferences(file):
+    rows = iter_sheet_rows(file)
+    next(rows)
+    names = header_names(next(rows))
+    positions, course_positions = survey_column_positions(names)
+
+    select = itemgetter(*positions) if len(positions) > 1 else lambda row: (row[positions[0]],)
+    width = len(names)
+    data = [select(row if len(row) >= width else tuple(row) + (None,) * (width - len(row))) for row in rows]
+    values = np.array(data, dtype=object).reshape(len(data), len(positions))
+    values[values == ""] = None
+    # Drop trailing empty rows
+    non_empty_rows = np.flatnonzero((values != None).any(axis=1))
+    values = values[:non_empty_rows[-1] + 1 if len(non_empty_rows) else 0]
+
+    columns = {}
+    course_columns = [i for i, position in enumerate(positions) if position in course_positions]
+    rank_column = {i: j for j, i in enumerate(course_columns)}
+    try:
+        ranks = values[:, course_columns].astype(float)
+    except (TypeError, ValueError):
+        ranks = np.column_stack([pd.to_numeric(values[:, i], errors="coerce") for i in course_columns]).astype(float) if course_columns else None
+    for i, position in enumerate(positions):
+        column = values[:, i]
+        if names[position] == "End Date":
+            columns[names[position]] = pd.to_datetime(column)
+        elif position in course_positions:
+            columns[names[position]] = ranks[:, rank_column[i]]
+        else:
+            # Integer-valued numbers as integers, as pandas does
+            columns[names[position]] = pd.Series([int(value) if isinstance(value, float) and value.is_integer() else value for value in column], dtype=object)
+    return pd.DataFrame(columns)
@@ -0,0 +1,51 @@
+# Parsing of the contract percentages typed by the TAs in the two workload text boxes of the survey (decreased and
+# increased load), vectorized over whole columns. Units:
+#   - a number followed by "%" is a percentage: "12.5%", "25 %" -> 0.125, 0.25
+#   - a number without "%" is a fraction of a full contract up to 1, a percentage above: "0.4", 0.4, "40", 40 -> 0.4
+#   - decimal commas are accepted: "12,5%" -> 0.125
+# Answers without a number ("fifty"), with several numbers ("30 or 40") or above 100% are unparseable: they count as
+# missing and are reported (see issues_report).
+import pandas as pd
+import numpy as np
+
+# Bounds of a requested load (contract percentage as a fraction)
+MIN_LOAD = 0.1
+MAX_LOAD = 0.5
+
+NUMBER_PATTERN = r"(?P<number>\d+(?:[.,]\d+)?|[.,]\d+)\s*(?P<percent>%)?"
+ANY_NUMBER_PATTERN = r"\d+(?:[.,]\d+)?|[.,]\d+"
+
+
+# Requested loads (fractions, NaN when missing or unparseable) and the issue of each unparseable answer (NaN otherwise)
+def parse_loads(answers):
+    answers = pd.Series(answers, dtype=object)
+    text = answers.astype(str).where(answers.notna())
+    extracted = text.str.extract(NUMBER_PATTERN)
+    numbers = pd.to_numeric(extracted["number"].str.replace(",", ".", regex=False), errors="coerce")
+    percentage = extracted["percent"].notna() | (numbers > 1)
+    loads = numbers.where(~percentage, numbers / 100)
+
+    number_count = text.str.count(ANY_NUMBER_PATTERN)
+    issues = pd.Series(np.select(
+        [answers.isna(), numbers.isna(), number_count > 1, loads > 1],
+        [None, "no number", "several numbers", "above 100%"],
+        default=None,
+    ), index=answers.index, dtype=object)
+    return loads.where(issues.isna()), issues
+
+# Requested load of each TA: mean of the parsed answers, within [MIN_LOAD, MAX_LOAD] (NaN when none is parseable)
+def requested_load(*loads, min_load=MIN_LOAD, max_load=MAX_LOAD):
+    return np.clip(pd.concat(loads, axis=1).mean(axis=1), min_load, max_load)
+
+# Unparseable answers: one row per TA and question ({question: (answers, issues)}) with the answer and its issue
+def issues_report(tas, questions):
+    reports = []
+    for question, (answers, issues) in questions.items():
+        unparseable = issues.notna()
+        reports.append(pd.DataFrame({
+            "TA": tas[unparseable].to_numpy(),
+            "QUESTION": question,
+            "ANSWER": answers[unparseable].astype(str).to_numpy(),
+            "ISSUE": issues[unparseable].to_numpy(),
+        }))
+    return pd.concat(reports, ignore_index=True).sort_values(["TA", "QUESTION"]).reset_index(drop=True)
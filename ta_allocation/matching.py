@@ -0,0 +1,117 @@
+# Matching of the survey courses to the DSD courses of the course catalog (see catalog.py).
+# Hash indexes are built once over the DSD courses, and every survey course is resolved in one pass, trying in order:
+# the exact key, code + period + language, name + period + language, code + period, the normalized name in the same
+# period and language, the normalized name in the same period (another language) and, last, the closest normalized
+# name in the same period and program (same first digit of the code, and same numbers: ex. "Finance I" never matches
+# "Finance II"). Each match comes with a confidence between 0 and 1. Normalized name matches in another language and
+# fuzzy matches are only suggestions for review (see REVIEW_ONLY): another language is another section of the course,
+# and similar names can be different courses.
+import difflib
+import re
+import unicodedata
+
+import pandas as pd
+import numpy as np
+
+from ta_allocation import catalog
+
+# Confidence of each matching method (the fuzzy one is also scaled by the name similarity)
+MATCH_CONFIDENCE = {
+    "exact": 1.0,
+    "code, period and language": 0.95,
+    "name, period and language": 0.9,
+    "code and period": 0.8,
+    "normalized name": 0.75,
+    "normalized name, other language": 0.7,
+    "fuzzy name": 0.7,
+}
+# Minimum similarity (difflib ratio) of two normalized names for a fuzzy match; None disables fuzzy matching
+FUZZY_CUTOFF = 0.8
+# Matching methods whose matches are reported for review but never used in the allocation ("Microeconomics" and
+# "Macroeconomics" are 0.93 similar; the EN and PT sections of a course are allocated separately)
+REVIEW_ONLY = {"normalized name, other language", "fuzzy name"}
+
+ROMAN_NUMERAL = re.compile(r"^[ivxl]+$")
+
+
+# Course name without case, accents, punctuation and repeated spaces
+def normalize_name(name):
+    if pd.isna(name):
+        return ""
+    name = unicodedata.normalize("NFKD", str(name)).encode("ascii", "ignore").decode()
+    return " ".join(re.sub(r"[^0-9a-z]+", " ", name.lower()).split())
+
+# Program of a course code (its first digit: "1" for bachelor's and "2" for master's courses)
+def program(code):
+    return str(code)[:1]
+
+# Numbers of a normalized name (tokens with digits and roman numerals), which must be equal for a fuzzy match
+def name_numbers(normalized_name):
+    return tuple(token for token in normalized_name.split() if any(character.isdigit() for character in token) or ROMAN_NUMERAL.match(token))
+
+# Hash indexes over the DSD courses of the catalog, each key giving its course IDs in DSD order
+def build_course_index(course_catalog):
+    index = {"exact": set(), "code, period and language": {}, "name, period and language": {}, "code and period": {},
+             "normalized name": {}, "normalized name, other language": {}, "period names": {}}
+    dsd_courses = course_catalog[course_catalog["dsd"]]
+    for course_id, code, name, period, language in zip(dsd_courses.index, *(dsd_courses[column].to_numpy() for column in catalog.KEY_PARTS)):
+        normalized_name = normalize_name(name)
+        index["exact"].add(course_id)
+        index["code, period and language"].setdefault((code, period, language), []).append(course_id)
+        index["name, period and language"].setdefault((name, period, language), []).append(course_id)
+        index["code and period"].setdefault((code, period), []).append(course_id)
+        index["normalized name"].setdefault((normalized_name, period, language), []).append(course_id)
+        index["normalized name, other language"].setdefault((normalized_name, period), []).append(course_id)
+        index["period names"].setdefault(period, {}).setdefault(normalized_name, []).append((course_id, language, program(code)))
+    return index
+
+# DSD course IDs matching one catalog course, with the matching method and confidence ([] if not matched)
+def match_course(course_id, code, name, period, language, index, fuzzy_cutoff=FUZZY_CUTOFF):
+    if course_id in index["exact"]:
+        return [course_id], "exact", MATCH_CONFIDENCE["exact"]
+    for method, key in (("code, period and language", (code, period, language)),
+                        ("name, period and language", (name, period, language)),
+                        ("code and period", (code, period))):
+        if key in index[method]:
+            return index[method][key], method, MATCH_CONFIDENCE[method]
+
+    normalized_name = normalize_name(name)
+    if (normalized_name, period, language) in index["normalized name"]:
+        return index["normalized name"][(normalized_name, period, language)], "normalized name", MATCH_CONFIDENCE["normalized name"]
+    if (normalized_name, period) in index["normalized name, other language"]:
+        # A single course (the sections in other languages are different courses of the DSD)
+        method = "normalized name, other language"
+        return index[method][(normalized_name, period)][:1], method, MATCH_CONFIDENCE[method]
+
+    period_names = index["period names"].get(period, {})
+    if fuzzy_cutoff is not None and normalized_name and period_names:
+        numbers = name_numbers(normalized_name)
+        course_program = program(code)
+        candidates = [candidate for candidate, matches in period_names.items()
+                      if name_numbers(candidate) == numbers and any(match_program == course_program for *_, match_program in matches)]
+        close_names = difflib.get_close_matches(normalized_name, candidates, n=1, cutoff=fuzzy_cutoff)
+        if close_names:
+            matches = [match for match in period_names[close_names[0]] if match[2] == course_program]
+            # A single course, in the same language if possible
+            same_language = [match for match, match_language, _ in matches if match_language == language]
+            similarity = difflib.SequenceMatcher(None, normalized_name, close_names[0]).ratio()
+            return (same_language or [matches[0][0]])[:1], "fuzzy name", round(MATCH_CONFIDENCE["fuzzy name"] * similarity, 3)
+
+    return [], None, None
+
+# Matches of catalog courses (one row per matched DSD course): "survey_course_id", "course_id" (DSD),
+# "match_method" and "match_confidence"; unmatched courses have no row. The matches of the REVIEW_ONLY methods are
+# included: see used_matches
+def match_courses(course_ids, course_catalog, fuzzy_cutoff=FUZZY_CUTOFF):
+    index = build_course_index(course_catalog)
+    course_ids = pd.unique(np.asarray(course_ids))
+    key_parts = [catalog.lookup(course_catalog, course_ids, column) for column in catalog.KEY_PARTS]
+    rows = []
+    for course_id, code, name, period, language in zip(course_ids.tolist(), *key_parts):
+        matches, method, confidence = match_course(course_id, code, name, period, language, index, fuzzy_cutoff)
+        rows += [(course_id, match, method, confidence) for match in matches]
+    return pd.DataFrame(rows, columns=["survey_course_id", "course_id", "match_method", "match_confidence"])
+
+# Matches used in the allocation (not REVIEW_ONLY)
+def used_matches(course_matches):
+    return course_matches[~course_matches["match_method"].isin(REVIEW_ONLY)]
@@ -0,0 +1,82 @@
+# Scenario sweeps: the greedy allocation over a grid of workload parameters (ex. "what if a BS weight unit were 0.1?").
+# The stages of stages.py which do not depend on the parameters (see CLEANING_STAGES) run once; the stages of each grid
+# point run in a pool of worker processes, which receive the cleaned results once (at start-up) instead of once per
+# scenario.
+import itertools
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+import numpy as np
+
+from ta_allocation import stages, workload
+
+# Stages (with the stages upstream of them) which do not depend on the workload parameters: the cleaning of the
+# courses, contracts and survey
+CLEANING_STAGES = ("courses", "adapted")
+# Stage of the greedy allocation reports (OUTPUTS #10 and #11) of a scenario
+SCENARIO_STAGE = "course_reports"
+
+# Inputs and cleaned stage results shared by the scenarios of a worker process (set by the pool initializer)
+_shared = {}
+
+
+# Every combination of the parameter values in "grid" ({"bs_weight_unit": [0.1, 0.125], ...}); parameters not in the
+# grid keep their default
+def parameter_grid(grid):
+    unknown = set(grid) - set(workload.DEFAULT_PARAMETERS)
+    if unknown:
+        raise ValueError(f"Unknown workload parameter(s): {', '.join(sorted(unknown))}")
+    names = list(grid)
+    return [{**workload.DEFAULT_PARAMETERS, **dict(zip(names, values))} for values in itertools.product(*(grid[name] for name in names))]
+
+# Matched/partial/unmatched courses, unmet needs and TA capacity of one scenario (from the results of run_stages)
+def summarize_scenario(results):
+    course_needs = results["course_reports"]["output_10"]
+    match = course_needs["MATCH"]
+    remaining_capacity = np.fromiter(results["allocation"]["remaining_capacity"].values(), dtype=float)
+    return {
+        "MATCHED COURSES": int((match == "MATCHED").sum()),
+        "PARTIAL COURSES": int((match == "PARTIAL").sum()),
+        "UNMATCHED COURSES": int((match == "NO").sum()),
+        "UNMET NEEDS": course_needs["NEEDS"].clip(lower=0).sum(),
+        "ALLOCATED LOAD": results["course_reports"]["output_11"]["LOAD"].sum(),
+        "LEFTOVER TA CAPACITY": np.nansum(remaining_capacity.clip(min=0)),
+    }
+
+# Stage results of CLEANING_STAGES, as a memo for run_stages
+def clean_inputs(inputs):
+    cleaned = {}
+    for target in CLEANING_STAGES:
+        stages.run_stages(inputs, target=target, memo=cleaned, memo_size=len(stages.STAGES))
+    return cleaned
+
+# The cleaned results are reused (they do not depend on the parameters), the other stages run again
+def run_scenario(inputs, cleaned, parameters):
+    results, _ = stages.run_stages({**inputs, "parameters": parameters}, target=SCENARIO_STAGE, memo=dict(cleaned))
+    return {**parameters, **summarize_scenario(results)}
+
+def _init_worker(inputs, cleaned):
+    _shared["inputs"] = inputs
+    _shared["cleaned"] = cleaned
+
+def _run_shared_scenario(parameters):
+    return run_scenario(_shared["inputs"], _shared["cleaned"], parameters)
+
+# Comparison table of the scenarios of "grid", one row per grid point (parameters, then results).
+# max_workers=1 runs the scenarios in this process; None uses one worker per CPU (at most one per scenario)
+def run_sweep(dsd_df, bs_weights_df, contract, preferences_df, term, grid, max_workers=None):
+    scenarios = parameter_grid(grid)
+    inputs = stages.pipeline_inputs(dsd_df, bs_weights_df, contract, preferences_df, term)
+    cleaned = clean_inputs(inputs)
+
+    workers = min(max_workers or os.cpu_count() or 1, len(scenarios))
+    if workers <= 1:
+        rows = [run_scenario(inputs, cleaned, parameters) for parameters in scenarios]
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(inputs, cleaned)) as executor:
+            rows = list(executor.map(_run_shared_scenario, scenarios))
+
+    comparison = pd.DataFrame(rows)
+    comparison.insert(0, "SCENARIO", range(1, len(comparison) + 1))
+    return comparison
@@ -0,0 +1,247 @@
+# The pipeline as a dependency graph of stages, each memoized on the hashes of its inputs: when one input changes
+# (ex. the BS weights file or the term), only the stages downstream of it run again. The survey cleaning only depends
+# on the survey, the contracts and the faculty e-mails, so it is reused across terms and weights. The analysis reports
+# (see REPORTS) are stages too, only run when one of them is requested (see report).
+import hashlib
+import pickle
+import io
+import threading
+import tracemalloc
+
+import pandas as pd
+import numpy as np
+
+from ta_allocation import diagnostics, engine, ingest, workload
+
+# Inputs of the graph (the uploaded tables and the options)
+INPUTS = ("dsd_df", "bs_weights_df", "contract", "preferences_df", "term", "parameters", "allocation_mode")
+
+
+# Stage functions taking the results of their dependencies (see STAGES)
+def _clean_preferences(preferences_df, contracts, faculty):
+    return engine.clean_preferences(preferences_df, contracts["zero_contracts"], faculty)
+
+def _reshape_preferences(preferences):
+    return engine.reshape_preferences(preferences["preferences_df_final"], preferences["survey_columns"])
+
+def _compute_contract_changes(preferences, contracts, parameters):
+    return engine.compute_contract_changes(preferences["preferences_df_final"], preferences["survey_columns"], contracts["contract"], parameters)
+
+def _build_market(adapted, contract_changes, courses, bs_weights, parameters):
+    return engine.build_market(adapted, contract_changes["all_contracts"], courses["course_demand"], courses["catalog"], bs_weights, parameters)
+
+def _allocate(market):
+    return engine.allocate(market["final_market"])
+
+def _main_outputs(courses, contracts, preferences, adapted, contract_changes, market, allocation, course_reports, allocation_mode):
+    cleaned = {"courses": courses, "contracts": contracts, "preferences": preferences, "adapted_df": adapted}
+    allocated = {"contract_changes": contract_changes, "market": market, "allocation": allocation, **course_reports}
+    return engine.main_outputs(cleaned, allocated, allocation_mode)
+
+# Stage name: (function, names of its inputs or upstream stages), in execution order
+STAGES = {
+    "faculty": (engine.faculty_emails, ("dsd_df",)),
+    "courses": (engine.process_courses, ("dsd_df", "term")),
+    "bs_weights": (engine.process_bs_weights, ("bs_weights_df", "parameters")),
+    "contracts": (engine.process_contracts, ("contract", "faculty")),
+    "preferences": (_clean_preferences, ("preferences_df", "contracts", "faculty")),
+    "adapted": (_reshape_preferences, ("preferences",)),
+    "contract_changes": (_compute_contract_changes, ("preferences", "contracts", "parameters")),
+    "market": (_build_market, ("adapted", "contract_changes", "courses", "bs_weights", "parameters")),
+    "allocation": (_allocate, ("market",)),
+    "course_reports": (engine.course_reports, ("courses", "bs_weights", "allocation", "parameters")),
+    "outputs": (_main_outputs, ("courses", "contracts", "preferences", "adapted", "contract_changes", "market", "allocation",
+                                "course_reports", "allocation_mode")),
+    "output_2": (engine.leaving_tas, ("preferences",)),
+    "output_3": (engine.ta_comments, ("preferences",)),
+    "output_4": (engine.unmatched_emails, ("preferences", "contracts")),
+    "output_6": (engine.tas_to_contact, ("contracts", "preferences", "adapted")),
+    "output_7": (engine.contract_change_requests, ("contract_changes",)),
+    "output_9": (engine.affected_tas, ("adapted", "market")),
+}
+
+# Analysis reports: stages which are not upstream of "outputs", run on demand
+REPORTS = ("output_2", "output_3", "output_4", "output_6", "output_7", "output_9")
+
+# Part of the engine (see the "PART" comments in engine.py) run by each stage
+STAGE_PARTS = {
+    "faculty": "1. List of courses",
+    "courses": "1. List of courses",
+    "bs_weights": "1. List of courses",
+    "contracts": "2. TAs current contract",
+    "preferences": "3.1 Cleaning the survey",
+    "adapted": "3.1 Cleaning the survey",
+    "contract_changes": "3.2 Contract changes",
+    "market": "4. Final data (market)",
+    "allocation": "5. Allocation",
+    "course_reports": "Outputs #10-11",
+    "outputs": "Outputs",
+    "output_2": "Outputs #2-9 (on demand)",
+    "output_3": "Outputs #2-9 (on demand)",
+    "output_4": "Outputs #2-9 (on demand)",
+    "output_6": "Outputs #2-9 (on demand)",
+    "output_7": "Outputs #2-9 (on demand)",
+    "output_9": "Outputs #2-9 (on demand)",
+}
+
+# Input files of a run and the input each one is parsed into
+FILE_INPUTS = {
+    "courses": "dsd_df",
+    "weights": "bs_weights_df",
+    "contracts": "contract",
+    "preferences": "preferences_df",
+}
+
+# Number of stage results kept in memory (least recently used ones are dropped first)
+MEMO_SIZE = 64
+
+# Stage results shared by the runs of this process, and the lock guarding them (Streamlit sessions run in threads)
+_memo = {}
+_memo_lock = threading.Lock()
+
+
+# Content hash of an input: tables by their values, index, column names and dtypes, other values by their pickle
+def input_hash(value):
+    digest = hashlib.sha256()
+    if isinstance(value, pd.DataFrame):
+        digest.update(pickle.dumps((list(value.columns), [str(dtype) for dtype in value.dtypes])))
+        digest.update(pd.util.hash_pandas_object(value, index=True).to_numpy().tobytes())
+    else:
+        digest.update(pickle.dumps(value))
+    return digest.hexdigest()
+
+# Key of every input and stage: a stage key combines its name with the keys of its inputs, so it changes
+# exactly when one of its (direct or upstream) inputs changes
+def stage_keys(inputs):
+    keys = {name: input_hash(inputs[name]) for name in INPUTS}
+    for name, (_, dependencies) in STAGES.items():
+        keys[name] = hashlib.sha256("|".join([name, *(keys[dependency] for dependency in dependencies)]).encode()).hexdigest()
+    return keys
+
+# Names of the stage "target" and of the stages upstream of it
+def upstream_stages(target):
+    names = set()
+    pending = [target]
+    while pending:
+        name = pending.pop()
+        if name in STAGES and name not in names:
+            names.add(name)
+            pending.extend(STAGES[name][1])
+    return names
+
+# Run the stage "target" and the stages upstream of it (every stage if "target" is None), reusing the memoized
+# results. Returns the inputs and results of these stages (by name), and the stages which ran. "keys" (from
+# stage_keys) saves hashing the inputs again. With a "records" list, every stage is measured (see diagnostics.py).
+# Stage results are shared between runs: the stages must not modify their inputs.
+def run_stages(inputs, target="outputs", memo=None, memo_size=MEMO_SIZE, records=None, keys=None):
+    memo = _memo if memo is None else memo
+    keys = stage_keys(inputs) if keys is None else keys
+    needed = set(STAGES) if target is None else upstream_stages(target)
+    results = dict(inputs)
+    executed = []
+    for name, (function, dependencies) in STAGES.items():
+        if name not in needed:
+            continue
+        key = (name, keys[name])
+        with _memo_lock:
+            result = memo.pop(key, None)
+        if result is None:
+            if records is None:
+                result = function(*(results[dependency] for dependency in dependencies))
+            else:
+                main_input = diagnostics.MAIN_INPUTS[name]
+                with diagnostics.measure(records, name, STAGE_PARTS[name], diagnostics.row_count(main_input, results[main_input])) as record:
+                    result = function(*(results[dependency] for dependency in dependencies))
+                    record["ROWS OUT"] = diagnostics.row_count(name, result)
+            executed.append(name)
+        elif records is not None:
+            main_input = diagnostics.MAIN_INPUTS[name]
+            records.append({"STEP": name, "PART": STAGE_PARTS[name], "ROWS IN": diagnostics.row_count(main_input, results[main_input]),
+                            "ROWS OUT": diagnostics.row_count(name, result), "CACHED": True, "SECONDS": 0.0, "PEAK MEMORY (MB)": None})
+        with _memo_lock:
+            # Re-inserted last: the memo is ordered from the least to the most recently used
+            memo[key] = result
+            while len(memo) > memo_size:
+                memo.pop(next(iter(memo)))
+        results[name] = result
+    return results, executed
+
+# Version of an output table, which changes exactly when its content does: its name and the key of the stage which
+# computes it (see stage_keys)
+def output_version(keys, name):
+    return f"{name}|{keys[name] if name in REPORTS else keys['outputs']}"
+
+# Analysis report "name" (see REPORTS), run from the memoized stages upstream of it
+def report(inputs, name, keys=None):
+    return run_stages(inputs, target=name, keys=keys)[0][name]
+
+# Main outputs and analysis reports of the results of every stage, in the order of the output numbers
+def all_outputs(results):
+    return engine.ordered_outputs({**results["outputs"], **{name: results[name] for name in REPORTS}})
+
+# Inputs of the graph, from the arguments of engine.run_pipeline
+def pipeline_inputs(dsd_df, bs_weights_df, contract, preferences_df, term, allocation_mode="greedy", parameters=workload.DEFAULT_PARAMETERS):
+    return {
+        "dsd_df": dsd_df,
+        "bs_weights_df": bs_weights_df,
+        "contract": contract,
+        "preferences_df": preferences_df,
+        "term": term,
+        "parameters": dict(parameters),
+        "allocation_mode": allocation_mode,
+    }
+
+# Output tables of every stage (see engine.run_pipeline), memoized across calls (memo={} runs every stage again)
+def run_pipeline(dsd_df, bs_weights_df, contract, preferences_df, term, allocation_mode="greedy", parameters=workload.DEFAULT_PARAMETERS, memo=None):
+    inputs = pipeline_inputs(dsd_df, bs_weights_df, contract, preferences_df, term, allocation_mode, parameters)
+    return all_outputs(run_stages(inputs, target=None, memo=memo)[0])
+
+def clear_memo():
+    with _memo_lock:
+        _memo.clear()
+
+# Tables of a stage result (a table, an array, or a dict of them), by name
+def result_tables(name, result):
+    if isinstance(result, dict):
+        return {f"{name}.{key}": value for key, value in result.items() if isinstance(value, (pd.DataFrame, pd.Series, np.ndarray))}
+    if isinstance(result, (pd.DataFrame, pd.Series, np.ndarray)):
+        return {name: result}
+    return {}
+
+# Rows and deep memory (MB) of the tables of every stage result (from run_stages)
+def memory_report(results):
+    rows = []
+    for name in STAGES:
+        if name not in results:
+            continue
+        for table, value in result_tables(name, results[name]).items():
+            if isinstance(value, np.ndarray):
+                memory = value.nbytes if value.dtype != object else pd.Series(value).memory_usage(deep=True, index=False)
+            else:
+                memory = value.memory_usage(deep=True).sum() if isinstance(value, pd.DataFrame) else value.memory_usage(deep=True)
+            rows.append({"STAGE": name, "TABLE": table, "ROWS": len(value), "MEMORY (MB)": memory / 1024 / 1024})
+    return pd.DataFrame(rows, columns=["STAGE", "TABLE", "ROWS", "MEMORY (MB)"])
+
+def parse_file(kind, file_data):
+    if kind == "preferences":
+        return ingest.read_preferences(io.BytesIO(file_data))
+    return pd.read_excel(io.BytesIO(file_data))
+
+# Run the ingestion of the files ({kind: bytes}, see FILE_INPUTS) and every stage (without reusing memoized results),
+# measuring each step; returns the output tables and the records. Tracing the memory slows the run down.
+def profile_run(file_data, term, allocation_mode="greedy", parameters=workload.DEFAULT_PARAMETERS, trace_memory=True):
+    records = []
+    started_tracing = trace_memory and not tracemalloc.is_tracing()
+    if started_tracing:
+        tracemalloc.start()
+    try:
+        inputs = {"term": term, "parameters": dict(parameters), "allocation_mode": allocation_mode}
+        for kind, input_name in FILE_INPUTS.items():
+            with diagnostics.measure(records, f"read {kind}", "Ingestion") as record:
+                inputs[input_name] = parse_file(kind, file_data[kind])
+                record["ROWS OUT"] = len(inputs[input_name])
+        results, _ = run_stages(inputs, target=None, memo={}, records=records)
+    finally:
+        if started_tracing:
+            tracemalloc.stop()
+    return all_outputs(results), records
@@ -0,0 +1,174 @@
+# Synthetic input files (DSD, BS weights, contracts and Qualtrics survey export) for benchmarks and demos, so that
+# no real TA data is needed. The survey follows the export conventions the pipeline expects: a first row of question
+# IDs, the questions on the second row, course columns named "<question> - <group> - Ranks - <CODE> - <NAME> || <TERM>
+# || <LANGUAGE> - Rank", the two workload text boxes after the availability question, and duplicate submissions of
+# the same TA told apart by their "End Date".
+#   python -m ta_allocation.synthetic <output_dir> --courses 40 --tas 60 --duplicates 10
+import argparse
+import os
+
+import pandas as pd
+import numpy as np
+
+from ta_allocation import engine
+
+# Sizes used by the benchmarks: (number of courses, number of TAs, number of duplicate submissions)
+SIZES = {
+    "small": (40, 60, 10),
+    "medium": (150, 400, 40),
+    "large": (500, 2000, 300),
+}
+
+FILE_NAMES = {
+    "courses": "dsd.xlsx",
+    "weights": "weights.xlsx",
+    "contracts": "contracts.xlsx",
+    "preferences": "preferences.xlsx",
+}
+
+SURVEY_METADATA = ["Start Date", "End Date", "Status", "IP Address", "Progress", "Duration (in seconds)", "Finished",
+                   "Recorded Date", "Response ID", "Recipient Last Name", "Recipient First Name", "Recipient Email",
+                   "External Data Reference", "Location Latitude", "Location Longitude", "Distribution Channel", "User Language"]
+# Answers of the workload text boxes, as typed by the TAs
+LOAD_ANSWERS = ["40%", "30", "0.3", "fifty", "12.5%", "100", "25 %", None, 35, 0.4]
+
+
+# Courses of the DSD: (code, name, term, language, cycle, number of classes)
+def synthetic_courses(rng, n_courses):
+    courses = []
+    for i in range(n_courses):
+        cycle = rng.choice(["BSC", "MST", "ME", "PHD"], p=[0.45, 0.4, 0.1, 0.05])
+        code = ("1" if cycle == "BSC" else "2") + f"{100 + i:03d}"
+        name = f"Course {chr(65 + i % 26)}{i}"
+        term = rng.choice(["S1", "T1", "T2", "S2", "T3", "T4"])
+        courses.append((code, name, term, rng.choice(["EN", "PT"]), cycle, int(rng.integers(1, 6))))
+    return courses
+
+def synthetic_dsd(rng, courses):
+    rows = []
+    for i, (code, name, term, language, cycle, classes) in enumerate(courses):
+        # Some BS courses are theoretical-practical (a class without faculty name)
+        theoretical_practical = cycle == "BSC" and rng.random() < 0.15
+        for c in range(classes):
+            no_faculty = theoretical_practical and c == 0
+            rows.append({"TERM": term, "CYCLE": cycle, "COURSE CODE": int(code), "COURSE NAME": name, "LANGUAGE": language,
+                         "CLASS": f"C{c}", "SLOTS": int(rng.integers(20, 80)),
+                         "FACULTY EMAIL": f"prof{i}@novasbe.pt" if no_faculty else f"prof{int(rng.integers(0, 20))}@novasbe.pt",
+                         "FACULTY NAME": None if no_faculty else "Prof X"})
+    return pd.DataFrame(rows)
+
+def synthetic_weights(rng, courses):
+    bs_courses = [course for course in courses if course[4] == "BSC"]
+    return pd.DataFrame({
+        "course": [f"{code} || {name} || {term} || {language}" for code, name, term, language, _, _ in bs_courses],
+        "course_code": [code for code, *_ in bs_courses],
+        "course_name": [name for _, name, *_ in bs_courses],
+        "period": [term for _, _, term, *_ in bs_courses],
+        "language": [language for _, _, _, language, *_ in bs_courses],
+        "weight": rng.integers(1, 5, len(bs_courses)),
+    })
+
+# Contracts of the TAs (some e-mails in upper case, some zero contracts, a faculty member, the last TAs missing)
+def synthetic_contracts(rng, n_tas):
+    tas = [f"TA{i}@novasbe.pt" if i % 7 == 0 else f"ta{i}@novasbe.pt" for i in range(n_tas)]
+    contracts = pd.DataFrame({"TA": tas, "CONTRACT": rng.choice([0, 0.125, 0.25, 0.375, 0.5], n_tas)})
+    return pd.concat([contracts.iloc[:-2], pd.DataFrame({"TA": ["prof1@novasbe.pt"], "CONTRACT": [0.5]})], ignore_index=True)
+
+# Course columns of the survey: the BS list shows the BS and ME courses (and a few others), sometimes with a different
+# code, name or language than in the DSD, and one course twice; the MS list shows the MS and PhD courses
+def survey_course_columns(rng, courses):
+    bs_columns = []
+    ms_columns = []
+    for code, name, term, language, cycle, _ in courses:
+        if cycle in ("BSC", "ME") or rng.random() < 0.2:
+            survey_code = code if rng.random() > 0.1 else code + "9"
+            survey_name = name if rng.random() > 0.1 else name + " (new)"
+            survey_language = language if rng.random() > 0.05 else ("PT" if language == "EN" else "EN")
+            bs_columns.append(f"{engine.BS_STR} - Group - Ranks - {survey_code} - {survey_name} || {term} || {survey_language} - Rank")
+        if cycle in ("MST", "PHD"):
+            ms_columns.append(f"{engine.MS_STR} - Group - Ranks - {code} - {name} || {term} || {language} - Rank")
+    if bs_columns:
+        bs_columns.append(bs_columns[0].replace(" - Group - ", " - Other group - "))
+    return bs_columns, ms_columns
+
+def synthetic_survey(rng, courses, n_tas, n_duplicates):
+    bs_columns, ms_columns = survey_course_columns(rng, courses)
+    questions = {
+        "continue": engine.CONTINUE_STR + " as Teaching Assistant?",
+        "continue_just": engine.CONTINUE_JUST_STR,
+        "ms_student": engine.MS_STUDENT_STR,
+        "bs_or_ms": engine.BS_OR_MS_STR + " Bear in mind that in most master's courses",
+        "phd_restrictions": engine.PHD_RESTRICTIONS_STR + "?",
+        "change_load": engine.LOAD_AVAILABILITY_STR,
+    }
+    headers = (SURVEY_METADATA + ["Full Name", engine.EMAIL_STR] + list(questions.values())
+               + ["Desired contract percentage (decrease)", "Desired contract percentage (increase)", engine.BS_STR + " Rank them"]
+               + bs_columns + [engine.MS_STR + " Rank them", engine.MS_STR + " - Other - Text"] + ms_columns + ["Any comments?"])
+    position = {header: i for i, header in enumerate(headers)}
+    course_positions = [position[column] for column in bs_columns + ms_columns]
+    answers = {key: [answer for answer in mapping if isinstance(answer, str)] + [None] for key, mapping in (
+        ("ms_student", engine.MS_STUDENT_MAPPING), ("bs_or_ms", engine.PREFERENCE_TYPE_MAPPING),
+        ("phd_restrictions", engine.PHD_RESTRICTIONS_MAPPING), ("change_load", engine.CHANGE_LOAD_MAPPING))}
+
+    # Respondents: most TAs with a contract and two without, some of them submitting twice
+    respondents = list(range(n_tas - 5)) + [n_tas + 1, n_tas + 2]
+    duplicates = list(rng.choice(respondents, min(n_duplicates, len(respondents)), replace=False))
+    submissions = [(i, False) for i in respondents] + [(i, True) for i in duplicates]
+    rng.shuffle(submissions)
+
+    start_date = pd.Timestamp("2023-05-01")
+    rows = []
+    for k, (i, duplicate) in enumerate(submissions):
+        row = [None] * len(headers)
+        row[position["Start Date"]] = start_date
+        row[position["End Date"]] = start_date + pd.Timedelta(minutes=int(rng.integers(0, 30000)))
+        row[position["Response ID"]] = f"R_{k}"
+        row[position["Full Name"]] = f"Person {i}"
+        row[position[engine.EMAIL_STR]] = f"TA{i}@novasbe.pt" if i % 5 == 0 else f"ta{i}@novasbe.pt"
+        leaving = rng.random() < 0.08
+        row[position[questions["continue"]]] = "No" if leaving else "Yes"
+        if leaving:
+            row[position[questions["continue_just"]]] = "Leaving for industry"
+        for key in answers:
+            row[position[questions[key]]] = answers[key][int(rng.integers(0, len(answers[key])))]
+        change_load = engine.CHANGE_LOAD_MAPPING.get(row[position[questions["change_load"]]], 0)
+        if change_load != 0:
+            row[position[questions["change_load"]] + (1 if change_load == -1 else 2)] = LOAD_ANSWERS[int(rng.integers(0, len(LOAD_ANSWERS)))]
+        # Half of the duplicate submissions have no course preferences
+        if course_positions and not (duplicate and rng.random() < 0.5):
+            picked = rng.choice(course_positions, min(len(course_positions), int(rng.integers(3, 9))), replace=False)
+            for rank, course_position in enumerate(picked):
+                row[course_position] = rank + 1
+        if rng.random() < 0.3:
+            row[-1] = "Some comment"
+        rows.append(row)
+
+    question_ids = [f"QID{j}" for j in range(len(headers))]
+    return pd.DataFrame([question_ids, headers] + rows)
+
+# Write the four input files of a synthetic faculty to "output_dir"; returns their paths (see FILE_NAMES)
+def generate(output_dir, n_courses=40, n_tas=60, n_duplicates=10, seed=1):
+    rng = np.random.default_rng(seed)
+    os.makedirs(output_dir, exist_ok=True)
+    courses = synthetic_courses(rng, n_courses)
+    paths = {kind: os.path.join(output_dir, file_name) for kind, file_name in FILE_NAMES.items()}
+    synthetic_dsd(rng, courses).to_excel(paths["courses"], index=False, engine="xlsxwriter")
+    synthetic_weights(rng, courses).to_excel(paths["weights"], index=False, engine="xlsxwriter")
+    synthetic_contracts(rng, n_tas).to_excel(paths["contracts"], index=False, engine="xlsxwriter")
+    synthetic_survey(rng, courses, n_tas, n_duplicates).to_excel(paths["preferences"], index=False, header=False, engine="xlsxwriter")
+    return paths
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m ta_allocation.synthetic", description="Write synthetic input files.")
+    parser.add_argument("output_dir")
+    parser.add_argument("--courses", type=int, default=40, help="number of courses (default: 40)")
+    parser.add_argument("--tas", type=int, default=60, help="number of TAs (default: 60)")
+    parser.add_argument("--duplicates", type=int, default=10, help="number of duplicate survey submissions (default: 10)")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args(argv)
+    for path in generate(args.output_dir, args.courses, args.tas, args.duplicates, args.seed).values():
+        print(path)
+
+
+if __name__ == "__main__":
+    main()
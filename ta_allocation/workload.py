@@ -0,0 +1,80 @@
+# Vectorized workload computations (course flags, course weights and contract levels) over whole columns
+import pandas as pd
+import numpy as np
+
+# MS grading hours per student in a semester / trimester course
+MS_SEMESTER_HOURS = 2.33
+MS_TRIMESTER_HOURS = 1.25
+# Weeks over which the MS grading hours are spread, and hours of a full-time work-week
+TEACHING_WEEKS = 16
+WORK_WEEK_HOURS = 36
+# Contract percentage of one unit of BS course weight, and of one contract level
+BS_WEIGHT_UNIT = 0.125
+CONTRACT_LEVEL = 0.125
+
+# Workload parameters of a run (the pipeline stages take them as a dict, so that scenarios can change any of them)
+DEFAULT_PARAMETERS = {
+    "bs_weight_unit": BS_WEIGHT_UNIT,
+    "contract_level": CONTRACT_LEVEL,
+    "semester_hours": MS_SEMESTER_HOURS,
+    "trimester_hours": MS_TRIMESTER_HOURS,
+    "teaching_weeks": TEACHING_WEEKS,
+    "work_week_hours": WORK_WEEK_HOURS,
+}
+MS_HOURS_PARAMETERS = ("semester_hours", "trimester_hours", "teaching_weeks", "work_week_hours")
+
+
+# Flag MS courses from their key ("CODE || NAME || TERM || LANGUAGE"): BS course codes start with "1"
+def masters_course_flag(courses):
+    return (~pd.Series(courses, dtype=object).str.startswith('1', na=False)).astype(np.int64).to_numpy()
+
+# Flag semester courses (term "S1"/"S2") from their key, as opposed to trimester courses ("T1"...)
+def semester_flag(courses):
+    terms = pd.Series(courses, dtype=object).str.split(' || ', regex=False).str[2]
+    return terms.str.startswith('S', na=False).astype(np.int64).to_numpy()
+
+# MS course weight (in full-time work-weeks) from its number of students; NaN for BS courses
+def ms_course_weight(number_students, semester, masters_course,
+                     semester_hours=MS_SEMESTER_HOURS, trimester_hours=MS_TRIMESTER_HOURS,
+                     teaching_weeks=TEACHING_WEEKS, work_week_hours=WORK_WEEK_HOURS):
+    number_students = np.asarray(number_students, dtype=float)
+    semester = np.asarray(semester, dtype=float)
+    masters_course = np.asarray(masters_course, dtype=float)
+    return np.select(
+        [(semester == 1) & (masters_course == 1), (semester == 0) & (masters_course == 1)],
+        [((number_students * semester_hours) / teaching_weeks) / work_week_hours,
+         ((number_students * trimester_hours) / teaching_weeks) / work_week_hours],
+        default=np.nan,
+    )
+
+# Initial needs of the DSD courses: number of classes times the BS weight for "BSC", hours-based weight for "MST"
+# (by "S"/"T" term), NaN otherwise
+def course_initial_needs(term, cycle, slots, classes, bs_weight,
+                         semester_hours=MS_SEMESTER_HOURS, trimester_hours=MS_TRIMESTER_HOURS,
+                         teaching_weeks=TEACHING_WEEKS, work_week_hours=WORK_WEEK_HOURS):
+    term = pd.Series(term, dtype=object)
+    cycle = np.asarray(cycle, dtype=object)
+    slots = np.asarray(slots, dtype=float)
+    semester = term.str.startswith('S', na=False).to_numpy()
+    trimester = term.str.startswith('T', na=False).to_numpy()
+    ms_weight = ms_course_weight(slots, semester, 1, semester_hours, trimester_hours, teaching_weeks, work_week_hours)
+    return np.select(
+        [cycle == "BSC", (cycle == "MST") & (semester | trimester)],
+        [np.asarray(classes, dtype=float) * np.asarray(bs_weight, dtype=float), ms_weight],
+        default=np.nan,
+    )
+
+# BS course weights in contract percentage, from the weights filled in the template
+def bs_course_weight(weight, bs_weight_unit=BS_WEIGHT_UNIT):
+    return weight * bs_weight_unit
+
+# Contract one level below the current one (for decrease requests without a requested load)
+def decreased_contract(contract, contract_level=CONTRACT_LEVEL):
+    return contract - contract_level
+
+# Keyword arguments of the MS hours-based weights from a parameters dict (missing ones take their default)
+def ms_hours(parameters):
+    return {name: parameters.get(name, DEFAULT_PARAMETERS[name]) for name in MS_HOURS_PARAMETERS}
+
+def parameter(parameters, name):
+    return parameters.get(name, DEFAULT_PARAMETERS[name])
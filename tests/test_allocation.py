@@ -0,0 +1,72 @@
+# Tests of allocation.deferred_acceptance against a brute-force check of stability: the loads respect the TA
+# capacities and course needs, and no TA and course would both rather exchange load with each other (blocking pair)
+import numpy as np
+
+from ta_allocation import allocation
+
+TOLERANCE = 1e-9
+
+
+# Run deferred acceptance on rows (TA, course, rank of the course for the TA, priority of the TA in the course)
+def run(rows, capacity, need):
+    ta_codes, course_codes, ranks, priorities = (np.array(column) for column in zip(*rows))
+    ta_order = np.lexsort((ranks, ta_codes))
+    loads = allocation.deferred_acceptance(ta_codes, course_codes, ta_order, priorities, capacity, need)
+    return loads, ta_codes, course_codes, ranks, priorities
+
+# Bounds of a capacity or need (missing and negative ones are zero)
+def bounds(values):
+    return np.nan_to_num(np.asarray(values, dtype=float), nan=0.0).clip(min=0)
+
+# Rows of the pairs (TA, course) which would both rather exchange load: the TA has free capacity or load in a course
+# it ranks lower, and the course has unmet need or load of a TA with a lower priority
+def blocking_pairs(rows, capacity, need):
+    loads, ta_codes, course_codes, ranks, priorities = run(rows, capacity, need)
+    free = bounds(capacity) - np.bincount(ta_codes, weights=loads, minlength=len(capacity))
+    unmet = bounds(need) - np.bincount(course_codes, weights=loads, minlength=len(need))
+    assert (loads >= 0).all() and (free >= -TOLERANCE).all() and (unmet >= -TOLERANCE).all()
+    blocking = []
+    for row in range(len(rows)):
+        ta, course = ta_codes[row], course_codes[row]
+        ta_would = free[ta] > TOLERANCE or any(loads[other] > TOLERANCE and ranks[other] > ranks[row]
+                                               for other in np.flatnonzero(ta_codes == ta))
+        course_would = unmet[course] > TOLERANCE or any(loads[other] > TOLERANCE and priorities[other] > priorities[row]
+                                                        for other in np.flatnonzero(course_codes == course))
+        if ta_would and course_would:
+            blocking.append(row)
+    return blocking
+
+def test_partial_rejection():
+    # TA 0 proposes 0.3 to course 0, which then prefers 0.4 of TA 1: only 0.2 of TA 0 is rejected, and moves to course 1
+    rows = [(0, 0, 1, 2), (0, 1, 2, 1), (1, 0, 1, 1)]
+    capacity, need = [0.3, 0.4], [0.5, 0.5]
+    np.testing.assert_allclose(run(rows, capacity, need)[0], [0.1, 0.2, 0.4])
+    assert blocking_pairs(rows, capacity, need) == []
+
+def test_need_below_one_ta_capacity():
+    # Course 0 only needs 0.1 of the 0.5 of TA 0, the rest goes to its next courses
+    rows = [(0, 0, 1, 1), (0, 1, 2, 1), (0, 2, 3, 1)]
+    capacity, need = [0.5], [0.1, 0.25, 0.5]
+    np.testing.assert_allclose(run(rows, capacity, need)[0], [0.1, 0.25, 0.15])
+    assert blocking_pairs(rows, capacity, need) == []
+
+def test_capacity_and_need_bounds():
+    # Missing or negative capacities and needs are zero; the other courses are over-demanded
+    rows = [(0, 0, 1, 3), (0, 1, 2, 1), (1, 0, 1, 1), (2, 0, 1, 2), (2, 2, 2, 1), (3, 1, 1, 2), (3, 3, 2, 1)]
+    capacity, need = [0.5, np.nan, 0.5, -0.25], [0.5, 0.25, np.nan, 0.5]
+    loads = run(rows, capacity, need)[0]
+    np.testing.assert_allclose(loads, [0.0, 0.25, 0.0, 0.5, 0.0, 0.0, 0.0])
+    assert blocking_pairs(rows, capacity, need) == []
+
+def test_random_instances_are_stable():
+    rng = np.random.default_rng(0)
+    for _ in range(200):
+        n_tas, n_courses = rng.integers(1, 6), rng.integers(1, 6)
+        pairs = [(ta, course) for ta in range(n_tas) for course in range(n_courses) if rng.random() < 0.6]
+        if not pairs:
+            continue
+        ranks, priorities = rng.permutation(len(pairs)), rng.permutation(len(pairs))
+        rows = [(ta, course, rank, priority) for (ta, course), rank, priority in zip(pairs, ranks, priorities)]
+        capacity = rng.choice([0.0, 0.1, 0.125, 0.25, 0.5], n_tas)
+        need = rng.choice([0.0, 0.05, 0.1, 0.25, 0.75], n_courses)
+        assert blocking_pairs(rows, capacity, need) == []
@@ -0,0 +1,81 @@
+# Regression tests of the merge of duplicate survey submissions in engine.clean_preferences: the questions answered
+# together are taken from one submission, never mixed across submissions
+import pandas as pd
+import numpy as np
+
+from ta_allocation import engine
+
+INCREASE, REDUCE = (next(answer for answer, value in engine.CHANGE_LOAD_MAPPING.items() if value == change) for change in (1, -1))
+
+HEADERS = ["End Date", "Full Name", engine.EMAIL_STR, engine.CONTINUE_STR + " as Teaching Assistant?", engine.CONTINUE_JUST_STR,
+           engine.MS_STUDENT_STR, engine.BS_OR_MS_STR, engine.PHD_RESTRICTIONS_STR + "?", engine.LOAD_AVAILABILITY_STR,
+           "Desired contract percentage (decrease)", "Desired contract percentage (increase)", engine.BS_STR + " Rank them",
+           f"{engine.BS_STR} - Group - Ranks - 1101 - Course A || S1 || EN - Rank", engine.MS_STR + " Rank them",
+           engine.MS_STR + " - Other - Text", f"{engine.MS_STR} - Group - Ranks - 2201 - Course M || T1 || EN - Rank", "Any comments?"]
+
+
+# One survey submission (the answers not given are empty)
+def submission(day, ta, continue_answer="Yes", justification=None, change_load=None, decreased=None, increased=None,
+               bs_rank=np.nan, ms_rank=np.nan, comment=None):
+    return [pd.Timestamp("2023-05-01") + pd.Timedelta(days=day), f"Person {ta}", f"ta{ta}@novasbe.pt", continue_answer, justification,
+            None, "Indifferent", None, change_load, decreased, increased, None, bs_rank, None, None, ms_rank, comment]
+
+SURVEY = pd.DataFrame([
+    # ta1: "increase, 40%" then "reduce, 30"
+    submission(1, 1, change_load=INCREASE, increased="40%", bs_rank=1),
+    submission(2, 1, change_load=REDUCE, decreased="30"),
+    # ta2: "increase, 0.3" then "reduce, fifty" (unparseable)
+    submission(1, 2, change_load=INCREASE, increased="0.3"),
+    submission(2, 2, change_load=REDUCE, decreased="fifty", bs_rank=2),
+    # ta3: leaving with a justification, then continuing
+    submission(1, 3, continue_answer="No", justification="Leaving for industry", comment="Older comment"),
+    submission(2, 3, continue_answer="Yes", ms_rank=1),
+    # ta4: "reduce, 25%" then a submission without the availability question
+    submission(1, 4, change_load=REDUCE, decreased="25%", ms_rank=3),
+    submission(2, 4, continue_answer=None),
+], columns=HEADERS)
+CONTRACTS = engine.process_contracts(pd.DataFrame({"TA": [f"ta{i}@novasbe.pt" for i in range(1, 5)], "CONTRACT": 0.25}), [])
+
+
+def clean():
+    return engine.clean_preferences(SURVEY, CONTRACTS["zero_contracts"], [])
+
+def merged_answers(keys):
+    preferences = clean()
+    cols = preferences["survey_columns"]
+    merged = preferences["preferences_df_final"].set_index("TA", drop=False)
+    return {ta: merged.loc[ta].iloc[[cols[key] for key in keys]].tolist() for ta in merged.index}
+
+def test_load_answers_come_from_one_submission():
+    answers = merged_answers(["change_load", "decreased_load", "increased_load"])
+    assert answers["ta1@novasbe.pt"] == [REDUCE, "30", None]
+    assert answers["ta2@novasbe.pt"] == [REDUCE, "fifty", None]
+    # The latest submission did not answer the availability question: the previous answers are kept together
+    assert answers["ta4@novasbe.pt"] == [REDUCE, "25%", None]
+
+def test_requested_loads():
+    preferences = clean()
+    contract_changes = engine.compute_contract_changes(preferences["preferences_df_final"], preferences["survey_columns"], CONTRACTS["contract"])
+    load_requested = contract_changes["new_contract"].set_index("TA")["load_requested"]
+    assert load_requested["ta1@novasbe.pt"] == 0.3
+    assert np.isnan(load_requested["ta2@novasbe.pt"])
+    assert load_requested["ta4@novasbe.pt"] == 0.25
+    assert contract_changes["output_15"]["TA"].tolist() == ["ta2@novasbe.pt"]
+
+def test_continue_answers_come_from_one_submission():
+    preferences = clean()
+    assert preferences["leaving"].empty
+    merged = preferences["preferences_df_final"].set_index("TA")
+    assert merged.loc["ta3@novasbe.pt", engine.CONTINUE_JUST_STR] is None
+    # A submission without the continue question does not override the previous answer
+    assert merged.loc["ta4@novasbe.pt", engine.CONTINUE_STR + " as Teaching Assistant?"] == "Yes"
+
+def test_standalone_answers_and_preferences():
+    merged = clean()["preferences_df_final"].set_index("TA")
+    # Comments stand alone: the latest non-empty one
+    assert merged.loc["ta3@novasbe.pt", "Any comments?"] == "Older comment"
+    # Course ranks of the latest submission with any
+    assert merged.loc["ta1@novasbe.pt", "1101 || Course A || S1 || EN"] == 1
+    assert merged.loc["ta2@novasbe.pt", "1101 || Course A || S1 || EN"] == 2
+    assert np.isnan(merged.loc["ta3@novasbe.pt", "1101 || Course A || S1 || EN"])
+    assert merged.loc["ta3@novasbe.pt", "2201 || Course M || T1 || EN"] == 1
@@ -0,0 +1,63 @@
+# Tests of the parsing of the contract percentages typed by the TAs (load_requests.py): units, unparseable answers
+# (reported in OUTPUT #15) and the bounds of the requested load
+import pandas as pd
+import numpy as np
+
+from ta_allocation import engine, load_requests
+
+INCREASE, REDUCE = (next(answer for answer, value in engine.CHANGE_LOAD_MAPPING.items() if value == change) for change in (1, -1))
+
+HEADERS = ["End Date", "Full Name", engine.EMAIL_STR, engine.CONTINUE_STR + " as Teaching Assistant?", engine.CONTINUE_JUST_STR,
+           engine.MS_STUDENT_STR, engine.BS_OR_MS_STR, engine.PHD_RESTRICTIONS_STR + "?", engine.LOAD_AVAILABILITY_STR,
+           "Desired contract percentage (decrease)", "Desired contract percentage (increase)", engine.BS_STR + " Rank them",
+           f"{engine.BS_STR} - Group - Ranks - 1101 - Course A || S1 || EN - Rank", engine.MS_STR + " Rank them",
+           engine.MS_STR + " - Other - Text", "Any comments?"]
+
+
+# One survey submission of TA "ta" asking for a decreased or increased load
+def submission(ta, change_load, decreased=None, increased=None):
+    return [pd.Timestamp("2023-05-01"), f"Person {ta}", f"ta{ta}@novasbe.pt", "Yes", None, None, "Indifferent", None,
+            change_load, decreased, increased, None, 1, None, None, None]
+
+SURVEY = pd.DataFrame([
+    submission(1, REDUCE, decreased="120%"),
+    submission(2, INCREASE, increased="30 or 40"),
+    submission(3, REDUCE, decreased="fifty"),
+    submission(4, REDUCE, decreased="5%"),
+    submission(5, INCREASE, increased="80"),
+    submission(6, REDUCE, decreased="0,2"),
+], columns=HEADERS)
+CONTRACTS = engine.process_contracts(pd.DataFrame({"TA": [f"ta{i}@novasbe.pt" for i in range(1, 7)], "CONTRACT": 0.25}), [])
+
+
+def test_units():
+    loads, issues = load_requests.parse_loads(["30%", "0,3", "30", 0.3, 30, "12,5 %", ".25", None])
+    np.testing.assert_allclose(loads[:7], [0.3, 0.3, 0.3, 0.3, 0.3, 0.125, 0.25])
+    assert np.isnan(loads[7])
+    assert issues.isna().all()
+
+def test_unparseable_answers():
+    loads, issues = load_requests.parse_loads(["120%", "150", "30 or 40", "fifty", ""])
+    assert loads.isna().all()
+    assert issues.tolist() == ["above 100%", "above 100%", "several numbers", "no number", "no number"]
+
+def test_requested_load_bounds():
+    requested = load_requests.requested_load(pd.Series([0.05, 0.8, 0.2, np.nan, np.nan]), pd.Series([np.nan, np.nan, 0.4, 0.3, np.nan]))
+    np.testing.assert_allclose(requested[:4], [load_requests.MIN_LOAD, load_requests.MAX_LOAD, 0.3, 0.3])
+    assert np.isnan(requested[4])
+
+def test_contract_changes():
+    preferences = engine.clean_preferences(SURVEY, CONTRACTS["zero_contracts"], [])
+    contract_changes = engine.compute_contract_changes(preferences["preferences_df_final"], preferences["survey_columns"], CONTRACTS["contract"])
+    # OUTPUT #15: every unparseable answer, with its question and issue
+    assert contract_changes["output_15"].values.tolist() == [
+        ["ta1@novasbe.pt", "Decreased load", "120%", "above 100%"],
+        ["ta2@novasbe.pt", "Increased load", "30 or 40", "several numbers"],
+        ["ta3@novasbe.pt", "Decreased load", "fifty", "no number"],
+    ]
+    load_requested = contract_changes["new_contract"].set_index("TA")["load_requested"]
+    assert load_requested[["ta1@novasbe.pt", "ta2@novasbe.pt", "ta3@novasbe.pt"]].isna().all()
+    # Clipped to [MIN_LOAD, MAX_LOAD]
+    assert load_requested["ta4@novasbe.pt"] == load_requests.MIN_LOAD
+    assert load_requested["ta5@novasbe.pt"] == load_requests.MAX_LOAD
+    assert load_requested["ta6@novasbe.pt"] == 0.2
@@ -0,0 +1,65 @@
+# Tests of the matching of the survey courses to the course list: normalized names in another language and fuzzy
+# names are only reported for review
+import pandas as pd
+
+from ta_allocation import catalog, matching
+
+DSD_COURSES = [
+    "1101 || Microeconomics || S1 || EN",
+    "2201 || Corporate Governance || T1 || EN",
+    "2202 || Investments || T1 || EN",
+    "1103 || Financial Accounting || S1 || PT",
+    "1161 || Course J61 || S2 || EN",
+    "1161 || Course J61 || S2 || PT",
+    "1105 || Marketing Analytics || S1 || EN",
+]
+SURVEY_COURSES = [
+    "1101 || Microeconomics || S1 || EN",
+    "1102 || Macroeconomics || S1 || EN",
+    "2205 || Corporate Finance || T1 || EN",
+    "1205 || Investment || T1 || EN",
+    "1104 || Financial Accounting || S1 || EN",
+    "11619 || Course J61 || S2 || PT",
+    "11619 || course J61. || S2 || EN",
+    "1106 || Marketing analytics! || S1 || EN",
+]
+COURSE_CATALOG = catalog.extend_catalog(catalog.build_catalog(DSD_COURSES), SURVEY_COURSES)
+
+
+# Survey courses of matches
+def survey_courses(matches):
+    return catalog.lookup(COURSE_CATALOG, matches["survey_course_id"], "course")
+
+def course_matches():
+    matches = matching.match_courses(catalog.course_ids(COURSE_CATALOG, SURVEY_COURSES), COURSE_CATALOG)
+    return pd.DataFrame({
+        "survey_course": survey_courses(matches),
+        "course": catalog.lookup(COURSE_CATALOG, matches["course_id"], "course"),
+        "match_method": matches["match_method"].to_numpy(),
+    }).set_index("survey_course"), matching.used_matches(matches)
+
+def test_similar_names_are_not_used_in_the_allocation():
+    matches, used = course_matches()
+    # "Microeconomics"/"Macroeconomics" and "Corporate Finance"/"Corporate Governance" are similar names of different courses
+    assert matches.loc["1102 || Macroeconomics || S1 || EN", "match_method"] == "fuzzy name"
+    assert matches.loc["2205 || Corporate Finance || T1 || EN", "match_method"] == "fuzzy name"
+    assert "1101 || Microeconomics || S1 || EN" in set(survey_courses(used))
+    assert "1102 || Macroeconomics || S1 || EN" not in set(survey_courses(used))
+    assert "2205 || Corporate Finance || T1 || EN" not in set(survey_courses(used))
+
+def test_fuzzy_matches_stay_within_the_program():
+    matches, _ = course_matches()
+    # A bachelor's course ("1205") is never matched to a master's course ("2202 || Investments")
+    assert "1205 || Investment || T1 || EN" not in matches.index
+
+def test_normalized_names_in_another_language_are_not_used_in_the_allocation():
+    matches, used = course_matches()
+    # Same name with a different code and language: reported, not allocated
+    assert matches.loc["1104 || Financial Accounting || S1 || EN", "match_method"] == "normalized name, other language"
+    assert "1104 || Financial Accounting || S1 || EN" not in set(survey_courses(used))
+    # With both sections in the DSD, only the section in the same language is matched (a single course)
+    assert matches.loc[["11619 || Course J61 || S2 || PT"], "course"].tolist() == ["1161 || Course J61 || S2 || PT"]
+    assert matches.loc[["11619 || course J61. || S2 || EN"], "course"].tolist() == ["1161 || Course J61 || S2 || EN"]
+    # Same normalized name and language: used
+    assert matches.loc["1106 || Marketing analytics! || S1 || EN", "match_method"] == "normalized name"
+    assert "1106 || Marketing analytics! || S1 || EN" in set(survey_courses(used))
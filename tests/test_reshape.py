@@ -0,0 +1,88 @@
+# Regression tests of engine.reshape_preferences (single pass over the course columns) against the per-course loop it
+# replaced (legacy_reshape_preferences below, as it was before the change)
+import pandas as pd
+import numpy as np
+
+from ta_allocation import engine
+
+BS_QUESTION = "Do you prefer to be assigned to Bachelor’s or Master's courses?"
+SURVEY_COLUMNS = {"bs_or_ms": 2, "bs_list": 3}
+
+# Courses of the fixture: "1123 || X" ends with "123 || X" (suffix collision) and "1101 || A" is listed twice
+COURSE_A = "1101 || A || S1 || EN"
+COURSE_B = "123 || X || S1 || EN"
+COURSE_B_SUFFIX = "1123 || X || S1 || EN"
+COURSE_M = "2201 || M || T1 || EN"
+
+
+def legacy_reshape_preferences(preferences_df_final, survey_columns):
+    course_columns = preferences_df_final.columns[survey_columns["bs_list"]:-1]
+    adapted_df = pd.DataFrame(columns=["TA", "course", "preference", "preference_type"])
+    for course in course_columns:
+        if course in adapted_df["course"].unique():
+            continue
+        duplicate_columns = [col for col in course_columns if col != course and col.endswith(course)]
+        combined_column = preferences_df_final[[course] + duplicate_columns].ffill(axis=1).iloc[:, -1]
+        non_null_mask = combined_column.notnull()
+        non_null_df = preferences_df_final[non_null_mask]
+        teacher_names = non_null_df["TA"]
+        preference_rankings = combined_column[non_null_mask]
+        preference_types = non_null_df.iloc[:, survey_columns["bs_or_ms"]].map(engine.PREFERENCE_TYPE_MAPPING)
+        course_df = pd.DataFrame({"TA": teacher_names, "course": [course] * len(teacher_names),
+                                  "preference": preference_rankings, "preference_type": preference_types})
+        adapted_df = pd.concat([adapted_df, course_df], ignore_index=True)
+        adapted_df['masters_course'] = adapted_df['course'].apply(lambda x: 0 if x.split(' ')[0].startswith('1') else 1)
+        adapted_df['preference'] = adapted_df['preference'].astype(np.int8)
+        adapted_df = adapted_df[adapted_df['preference']<=5]
+    return adapted_df
+
+# Cleaned survey with the course columns after the BS/MS question, and the comments last
+def survey(rows):
+    columns = ["Full Name", "TA", BS_QUESTION, COURSE_A, COURSE_B, COURSE_A, COURSE_B_SUFFIX, COURSE_M, "Any comments?"]
+    return pd.DataFrame(rows, columns=columns)
+
+FIXTURE = survey([
+    ["Person 1", "ta1@novasbe.pt", "Indifferent", 1, np.nan, 2, np.nan, 3, None],
+    ["Person 2", "ta2@novasbe.pt", "Masters' Courses", np.nan, 4, 1, 2, 7, "Comment"],
+    ["Person 3", "ta3@novasbe.pt", "Bachelors' Courses", 5, 1, np.nan, np.nan, np.nan, None],
+    ["Person 4", "ta4@novasbe.pt", None, np.nan, np.nan, np.nan, 3, 1, None],
+    ["Person 5", "ta5@novasbe.pt", "Indifferent", np.nan, np.nan, np.nan, np.nan, np.nan, None],
+])
+
+
+def rows(adapted_df):
+    return [(ta, course, int(preference)) for ta, course, preference in adapted_df[["TA", "course", "preference"]].itertuples(index=False)]
+
+def test_same_rows_as_the_per_course_loop():
+    adapted_df = engine.reshape_preferences(FIXTURE, SURVEY_COLUMNS)
+    legacy_df = legacy_reshape_preferences(FIXTURE, SURVEY_COLUMNS)
+    assert rows(adapted_df) == rows(legacy_df)
+    np.testing.assert_array_equal(adapted_df["preference_type"].astype(float), legacy_df["preference_type"].astype(float))
+    np.testing.assert_array_equal(adapted_df["masters_course"].astype(int), legacy_df["masters_course"].astype(int))
+
+def test_exact_rows():
+    assert rows(engine.reshape_preferences(FIXTURE, SURVEY_COLUMNS)) == [
+        ("ta1@novasbe.pt", COURSE_A, 2),
+        ("ta2@novasbe.pt", COURSE_A, 1),
+        ("ta3@novasbe.pt", COURSE_A, 5),
+        ("ta2@novasbe.pt", COURSE_B, 2),
+        ("ta3@novasbe.pt", COURSE_B, 1),
+        ("ta4@novasbe.pt", COURSE_B, 3),
+        ("ta2@novasbe.pt", COURSE_B_SUFFIX, 2),
+        ("ta4@novasbe.pt", COURSE_B_SUFFIX, 3),
+        ("ta1@novasbe.pt", COURSE_M, 3),
+        ("ta4@novasbe.pt", COURSE_M, 1),
+    ]
+
+# The duplicate columns of a course (same name, then the names ending with it) are combined keeping the last answered one
+def test_latest_non_null_precedence():
+    adapted_df = engine.reshape_preferences(FIXTURE, SURVEY_COLUMNS).set_index(["TA", "course"])["preference"]
+    # Same-name duplicates: the second "1101 || A" column wins over the first
+    assert adapted_df[("ta1@novasbe.pt", COURSE_A)] == 2
+    # Only the first column answered: kept
+    assert adapted_df[("ta3@novasbe.pt", COURSE_A)] == 5
+    # Suffix collision: "1123 || X" wins over "123 || X"
+    assert adapted_df[("ta2@novasbe.pt", COURSE_B)] == 2
+    assert adapted_df[("ta3@novasbe.pt", COURSE_B)] == 1
+    # Preferences above 5 are removed
+    assert ("ta2@novasbe.pt", COURSE_M) not in adapted_df.index